@@ -1,7 +1,11 @@
 import streamlit as st
 from PIL import Image, ImageDraw
-import io
-from src.face_processing.core import verify_images, analyze_face_attributes, extract_aligned_face_bytes
+import os
+from src.face_processing.core import verify_images, analyze_face_attributes, extract_face_records, represent_records_batch, sweep_models, make_thumbnail, decode_image_bytes, enroll_face, identify_face, ANALYZE_ACTIONS, MODEL_NAMES, DETECTOR_BACKENDS, DETECTION_MAX_SIDE
+from src.face_processing.gallery import FaceGallery
+from src.face_processing.model_registry import get_registry, default_preload_specs
+from src.face_processing.utils import content_hash, DISTANCE_METRICS
+from src.face_processing.profiling import StageProfiler
 
 # --- Konfigurasi Halaman Streamlit ---
 st.set_page_config(
@@ -102,13 +106,26 @@ def load_custom_css():
 
 load_custom_css()
 
+# --- Preload Model (sekali per konfigurasi per proses, bukan per rerun) ---
+@st.cache_resource(show_spinner="Memuat & warmup model...")
+def preload_models(model_name, detector_backend, actions):
+    # Hanya model atribut untuk aksi yang dicentang yang dimuat
+    registry = get_registry()
+    registry.preload(default_preload_specs(model_name, detector_backend, list(actions)), warmup=True)
+    return registry
+
 # --- Inisialisasi Session State (Sama) ---
 SESSION_KEYS_DEFAULTS = {
     'img1_bytes_original': None, 'img2_bytes_original': None, 'img1_name': None, 'img2_name': None,
-    'img1_cropped_bytes': None, 'img2_cropped_bytes': None, 'img1_original_region': None, 'img2_original_region': None,
+    'img1_thumbnail': None, 'img2_thumbnail': None, 'img1_image_size': None, 'img2_image_size': None,
+    'img1_face_record': None, 'img2_face_record': None, 'img1_original_region': None, 'img2_original_region': None,
+    'img1_face_records': None, 'img2_face_records': None, 'img1_face_index': 0, 'img2_face_index': 0,
+    'img1_timings': None, 'img2_timings': None,
     'similarity_result': None, 'img1_attributes': None, 'img2_attributes': None,
     'selected_model': "VGG-Face", 'selected_detector': "opencv", 'selected_distance_metric': "cosine",
-    'analysis_button_clicked': False
+    'analysis_button_clicked': False, 'app_mode': "Verifikasi 2 Gambar",
+    'action_age': True, 'action_emotion': True, 'action_gender': True, 'action_race': True,
+    'sweep_result': None
 }
 for key, default_value in SESSION_KEYS_DEFAULTS.items():
     if key not in st.session_state: st.session_state[key] = default_value
@@ -124,76 +141,280 @@ st.markdown("<hr class='styled-hr'>", unsafe_allow_html=True)
 # --- Fungsi Utilitas Reset (Sama) ---
 def reset_specific_image_states(img_key_prefix):
     keys_to_reset = [f'{img_key_prefix}_bytes_original', f'{img_key_prefix}_name', 
-                     f'{img_key_prefix}_cropped_bytes', f'{img_key_prefix}_original_region', 
-                     f'{img_key_prefix}_attributes', 'similarity_result', 'analysis_button_clicked']
+                     f'{img_key_prefix}_thumbnail', f'{img_key_prefix}_image_size', f'{img_key_prefix}_face_record',
+                     f'{img_key_prefix}_face_records', f'{img_key_prefix}_face_index',
+                     f'{img_key_prefix}_original_region', f'{img_key_prefix}_timings',
+                     f'{img_key_prefix}_attributes', 'similarity_result', 'sweep_result', 'analysis_button_clicked']
     for key in keys_to_reset:
         if key in st.session_state: st.session_state[key] = SESSION_KEYS_DEFAULTS.get(key)
 
 def reset_all_on_setting_change():
-    keys_to_reset = [k for k in SESSION_KEYS_DEFAULTS if k not in ['selected_model', 'selected_detector', 'selected_distance_metric']]
+    keys_to_reset = [k for k in SESSION_KEYS_DEFAULTS if k not in ['selected_model', 'selected_detector', 'selected_distance_metric', 'app_mode'] and not k.startswith('action_')]
     for key in keys_to_reset:
         st.session_state[key] = SESSION_KEYS_DEFAULTS.get(key)
 
+def reset_similarity_on_setting_change():
+    # Model/metrik tidak memengaruhi deteksi; hasil crop dipertahankan dan embedding diambil dari cache
+    st.session_state.similarity_result = SESSION_KEYS_DEFAULTS.get('similarity_result')
+
+# --- Aksi Atribut (hanya aksi yang dicentang yang dihitung) ---
+ACTION_LABELS = {'age': "Umur", 'emotion': "Emosi", 'gender': "Gender", 'race': "Ras"}
+
+def selected_actions():
+    return [action for action in ANALYZE_ACTIONS if st.session_state[f'action_{action}']]
+
+def refresh_attributes_on_action_change():
+    # Atribut disimpan per aksi di cache; hanya aksi yang baru dicentang yang benar-benar dihitung
+    for img_prefix in ('img1', 'img2'):
+        if st.session_state[f'{img_prefix}_attributes'] and st.session_state[f'{img_prefix}_face_records']:
+            st.session_state[f'{img_prefix}_attributes'] = analyze_face_attributes(
+                st.session_state[f'{img_prefix}_face_records'], st.session_state.selected_detector, selected_actions())
+
+# --- Multi-wajah: semua wajah satu gambar dideteksi sekali, pengguna memilih wajah yang dibandingkan ---
+def select_face(img_prefix):
+    record = st.session_state[f'{img_prefix}_face_records'][st.session_state[f'{img_prefix}_face_index']]
+    st.session_state[f'{img_prefix}_face_record'] = record
+    st.session_state[f'{img_prefix}_original_region'] = record.region
+    st.session_state.similarity_result = None
+
+def draw_face_boxes(thumbnail, image_size, records, selected_index):
+    """
+    Thumbnail (BGR) dengan kotak untuk setiap wajah; wajah terpilih ditandai hijau dan lebih tebal.
+    Region berada di koordinat resolusi penuh ('image_size') sehingga diskalakan ke ukuran thumbnail.
+    """
+    img_pil = Image.fromarray(thumbnail[:, :, ::-1])
+    scale = thumbnail.shape[1] / image_size['w'] if image_size else 1.0
+    draw = ImageDraw.Draw(img_pil)
+    for i, record in enumerate(records or []):
+        x, y, w, h = (record.region[k] * scale for k in ('x', 'y', 'w', 'h'))
+        selected = i == selected_index
+        color = "#66BB6A" if selected else "#FFA726"
+        draw.rectangle([x, y, x + w, y + h], outline=color, width=3 if selected else 2)
+        if len(records) > 1:
+            draw.text((x + 4, y + 2), str(i + 1), fill=color)
+    return img_pil
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_thumbnail_rgb(img_bytes):
+    # Di-cache per isi file: rerun tidak men-decode ulang foto resolusi penuh
+    return make_thumbnail(img_bytes)[:, :, ::-1]
+
+
+# --- Mode Aplikasi ---
+MODE_VERIFY, MODE_IDENTIFY, MODE_SWEEP = "Verifikasi 2 Gambar", "Identifikasi (1:N)", "Bandingkan Model × Metrik"
+GALLERY_DIR = os.path.join("data", "gallery")
+
+@st.cache_resource
+def load_gallery(root_dir):
+    return FaceGallery(root_dir)
+
 
 # --- Kontrol di Sidebar (Sama) ---
 with st.sidebar:
+    st.radio("Mode:", [MODE_VERIFY, MODE_IDENTIFY, MODE_SWEEP], key="app_mode", horizontal=True)
     st.markdown("## ⚙ Pengaturan Analisis")
-    models = ["VGG-Face", "Facenet", "Facenet512", "OpenFace", "DeepFace", "DeepID", "ArcFace", "Dlib", "SFace"]
-    detectors = ['opencv', 'ssd', 'dlib', 'mtcnn', 'retinaface', 'mediapipe']
-    distance_metrics = ["cosine", "euclidean", "euclidean_l2"]
-    st.selectbox("Model Similaritas:", models, key="selected_model", on_change=reset_all_on_setting_change)
+    models = MODEL_NAMES
+    detectors = DETECTOR_BACKENDS
+    distance_metrics = DISTANCE_METRICS
+    st.selectbox("Model Similaritas:", models, key="selected_model", on_change=reset_similarity_on_setting_change)
     st.selectbox("Detektor Wajah:", detectors, key="selected_detector", on_change=reset_all_on_setting_change)
-    st.selectbox("Metrik Jarak (Similaritas):", distance_metrics, key="selected_distance_metric", on_change=reset_all_on_setting_change)
-    st.markdown("---")
-    st.markdown("## 🖼 Unggah Gambar Asli")
-    def handle_file_upload(img_prefix, uploader_key):
-        reset_specific_image_states(img_prefix)
-        uploaded_file = st.session_state[uploader_key]
-        if uploaded_file is not None:
-            st.session_state[f'{img_prefix}_bytes_original'] = uploaded_file.getvalue()
-            st.session_state[f'{img_prefix}_name'] = uploaded_file.name
-            with st.spinner(f"Mengekstrak wajah Gbr {img_prefix[-1]}..."):
-                extract_res = extract_aligned_face_bytes(st.session_state[f'{img_prefix}_bytes_original'], st.session_state.selected_detector)
-                if extract_res and not extract_res.get("error"):
-                    st.session_state[f'{img_prefix}_cropped_bytes'] = extract_res["face_bytes"]
-                    st.session_state[f'{img_prefix}_original_region'] = extract_res["original_region"]
-                else: 
-                    st.sidebar.error(f"Gbr {img_prefix[-1]}: {extract_res.get('error', 'Gagal extract wajah.')}")
-                    st.session_state[f'{img_prefix}_cropped_bytes'] = None 
-                    st.session_state[f'{img_prefix}_original_region'] = None
-    st.file_uploader("Pilih Gambar Wajah 1", type=["jpg", "jpeg", "png"], key="uploader_img1", on_change=handle_file_upload, args=("img1", "uploader_img1"))
-    st.file_uploader("Pilih Gambar Wajah 2", type=["jpg", "jpeg", "png"], key="uploader_img2", on_change=handle_file_upload, args=("img2", "uploader_img2"))
-    st.markdown("---")
-    analyze_button_disabled = not (st.session_state.img1_cropped_bytes or st.session_state.img2_cropped_bytes)
-    analyze_button = st.button("🚀 Analisis & Prediksi Sekarang!", type="primary", use_container_width=True, disabled=analyze_button_disabled)
-    if analyze_button: st.session_state.analysis_button_clicked = True
+    st.selectbox("Metrik Jarak (Similaritas):", distance_metrics, key="selected_distance_metric", on_change=reset_similarity_on_setting_change)
+    st.markdown("Atribut yang Dianalisis:")
+    action_cols = st.columns(2)
+    for i, action in enumerate(ANALYZE_ACTIONS):
+        action_cols[i % 2].checkbox(ACTION_LABELS[action], key=f"action_{action}", on_change=refresh_attributes_on_action_change)
+    model_registry = preload_models(st.session_state.selected_model, st.session_state.selected_detector, tuple(selected_actions()))
+    with st.expander("Status Model"):
+        st.dataframe(model_registry.stats(), use_container_width=True)
+    if st.session_state.app_mode in (MODE_VERIFY, MODE_SWEEP):
+        st.markdown("---")
+        st.markdown("## 🖼 Unggah Gambar Asli")
+        def handle_file_upload(img_prefix, uploader_key):
+            reset_specific_image_states(img_prefix)
+            uploaded_file = st.session_state[uploader_key]
+            if uploaded_file is not None:
+                profiler = StageProfiler()
+                with profiler.stage("upload_read"):
+                    st.session_state[f'{img_prefix}_bytes_original'] = uploaded_file.getvalue()
+                st.session_state[f'{img_prefix}_name'] = uploaded_file.name
+                # Satu scaled decode: salinan deteksi dipakai detektor dan thumbnail diperkecil dari salinan yang sama;
+                # resolusi penuh hanya di-decode saat wajah perlu di-crop
+                try:
+                    with profiler.stage("decode_scaled"):
+                        detection_image = decode_image_bytes(st.session_state[f'{img_prefix}_bytes_original'], max_side=DETECTION_MAX_SIDE)
+                    with profiler.stage("thumbnail"):
+                        st.session_state[f'{img_prefix}_thumbnail'] = make_thumbnail(detection_image)
+                except ValueError as e:
+                    st.sidebar.error(f"Gbr {img_prefix[-1]}: {e}")
+                    return
+                with st.spinner(f"Mengekstrak wajah Gbr {img_prefix[-1]}..."):
+                    # Deteksi hanya sekali per unggahan; record dipakai ulang oleh analisis & verifikasi
+                    with profiler.stage("hash"):
+                        source_hash = content_hash(st.session_state[f'{img_prefix}_bytes_original'])
+                    # Semua wajah dalam gambar diambil dari satu pemanggilan detektor
+                    extract_res = extract_face_records(st.session_state[f'{img_prefix}_bytes_original'], st.session_state.selected_detector,
+                                                       source_hash=source_hash, profiler=profiler, detection_image=detection_image)
+                    st.session_state[f'{img_prefix}_timings'] = profiler.breakdown()
+                    st.session_state[f'{img_prefix}_image_size'] = extract_res.get("image_size")
+                    if extract_res and not extract_res.get("error"):
+                        st.session_state[f'{img_prefix}_face_records'] = extract_res["records"]
+                        st.session_state[f'{img_prefix}_face_index'] = 0
+                        select_face(img_prefix)
+                    else: 
+                        st.sidebar.error(f"Gbr {img_prefix[-1]}: {extract_res.get('error', 'Gagal extract wajah.')}")
+                        st.session_state[f'{img_prefix}_face_records'] = None
+                        st.session_state[f'{img_prefix}_face_record'] = None
+                        st.session_state[f'{img_prefix}_original_region'] = None
+        st.file_uploader("Pilih Gambar Wajah 1", type=["jpg", "jpeg", "png"], key="uploader_img1", on_change=handle_file_upload, args=("img1", "uploader_img1"))
+        st.file_uploader("Pilih Gambar Wajah 2", type=["jpg", "jpeg", "png"], key="uploader_img2", on_change=handle_file_upload, args=("img2", "uploader_img2"))
+        st.markdown("---")
+        if st.session_state.app_mode == MODE_VERIFY:
+            analyze_button_disabled = not (st.session_state.img1_face_record or st.session_state.img2_face_record)
+            analyze_button = st.button("🚀 Analisis & Prediksi Sekarang!", type="primary", use_container_width=True, disabled=analyze_button_disabled)
+            if analyze_button: st.session_state.analysis_button_clicked = True
     st.markdown("---")
     st.info(f"Konf: {st.session_state.selected_model}, *{st.session_state.selected_detector}, {st.session_state.selected_distance_metric}*.")
 
+# --- Mode Identifikasi 1:N ---
+def render_identify_mode():
+    gallery = load_gallery(GALLERY_DIR)
+    model, detector, metric = st.session_state.selected_model, st.session_state.selected_detector, st.session_state.selected_distance_metric
+    st.markdown("<h2 class='section-title'>🗂 Identifikasi Wajah terhadap Galeri</h2>", unsafe_allow_html=True)
+    st.caption(f"Galeri model {model}: {gallery.size(model)} wajah terdaftar.")
+    enroll_col, search_col = st.columns(2, gap="large")
+    with enroll_col:
+        st.markdown("<h3 class='image-pair-title'>➕ Daftarkan Wajah</h3>", unsafe_allow_html=True)
+        with st.form("enroll_form", clear_on_submit=True):
+            identity = st.text_input("Nama / ID Identitas:")
+            enroll_files = st.file_uploader("Gambar wajah identitas", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+            enroll_submitted = st.form_submit_button("Daftarkan ke Galeri")
+        if enroll_submitted:
+            if not identity.strip() or not enroll_files:
+                st.markdown("<div class='warning-message'>Isi nama identitas dan pilih minimal satu gambar.</div>", unsafe_allow_html=True)
+            else:
+                with st.spinner(f"Mendaftarkan {len(enroll_files)} gambar..."):
+                    enrolled = 0
+                    for enroll_file in enroll_files:
+                        enroll_res = enroll_face(gallery, identity.strip(), enroll_file.getvalue(), model, detector, source=enroll_file.name)
+                        if enroll_res["error"]: st.markdown(f"<div class='error-message-custom'>{enroll_file.name}: {enroll_res['error']}</div>", unsafe_allow_html=True)
+                        else: enrolled += 1
+                if enrolled: st.markdown(f"<div class='success-message'>✅ {enrolled} wajah terdaftar sebagai '{identity.strip()}'.</div>", unsafe_allow_html=True)
+    with search_col:
+        st.markdown("<h3 class='image-pair-title'>🔎 Cari Identitas</h3>", unsafe_allow_html=True)
+        probe_file = st.file_uploader("Gambar wajah yang dicari", type=["jpg", "jpeg", "png"], key="uploader_probe")
+        top_k = st.slider("Jumlah kandidat (top-k):", 1, 20, 5)
+        if probe_file is not None:
+            try: st.image(cached_thumbnail_rgb(probe_file.getvalue()), use_container_width=True)
+            except ValueError as e: st.error(str(e))
+            if st.button("🔎 Identifikasi Sekarang!", type="primary", use_container_width=True):
+                with st.spinner("Mencari di galeri..."):
+                    identify_res = identify_face(gallery, probe_file.getvalue(), model, detector, metric, top_k)
+                if identify_res["error"]: st.markdown(f"<div class='error-message-custom'>{identify_res['error']}</div>", unsafe_allow_html=True)
+                elif not identify_res["matches"]: st.info("Galeri untuk model ini masih kosong.")
+                else:
+                    best = identify_res["matches"][0]
+                    if best["verified"]: st.markdown(f"<div class='success-message'>✅ Teridentifikasi: {best['identity']} (Distance: {best['distance']:.4f} ≤ Threshold: {best['threshold']:.2f})</div>", unsafe_allow_html=True)
+                    else: st.markdown(f"<div class='warning-message'>❌ Tidak ada identitas yang cocok. Terdekat: {best['identity']} (Distance: {best['distance']:.4f})</div>", unsafe_allow_html=True)
+                    st.dataframe([{"Peringkat": rank + 1, "Identitas": m["identity"], "Sumber": m["source"], "Distance": round(m["distance"], 4), "Cocok": "✅" if m["verified"] else "❌"}
+                                  for rank, m in enumerate(identify_res["matches"])], use_container_width=True)
+
+# --- Mode Perbandingan Model × Metrik ---
+def render_sweep_mode():
+    st.markdown("<h2 class='section-title'>📊 Perbandingan Model × Metrik</h2>", unsafe_allow_html=True)
+    record1, record2 = st.session_state.img1_face_record, st.session_state.img2_face_record
+    if not (record1 and record2):
+        st.info("Unggah dua gambar di sidebar; wajah yang dipilih di mode verifikasi akan dibandingkan.")
+        return
+    preview_cols = st.columns(2)
+    for col, img_prefix, record in ((preview_cols[0], 'img1', record1), (preview_cols[1], 'img2', record2)):
+        with col:
+            st.image(record.rgb_uint8, caption=st.session_state[f'{img_prefix}_name'], width=160)
+    sweep_models_selected = st.multiselect("Model:", MODEL_NAMES, default=MODEL_NAMES)
+    sweep_metrics_selected = st.multiselect("Metrik:", DISTANCE_METRICS, default=DISTANCE_METRICS)
+    max_workers = st.slider("Model paralel:", 1, 8, 4)
+    if st.button("📊 Jalankan Perbandingan", type="primary", use_container_width=True, disabled=not (sweep_models_selected and sweep_metrics_selected)):
+        # Deteksi tidak diulang (record dari unggahan); embedding tiap model dihitung sekali lalu dipakai untuk semua metrik
+        with st.spinner(f"Menghitung embedding {len(sweep_models_selected)} model..."):
+            st.session_state.sweep_result = sweep_models(record1, record2, sweep_models_selected, sweep_metrics_selected,
+                                                         st.session_state.selected_detector, max_workers=max_workers)
+    sweep_result = st.session_state.sweep_result
+    if not sweep_result:
+        return
+    if sweep_result["error"]:
+        st.markdown(f"<div class='error-message-custom'>{sweep_result['error']}</div>", unsafe_allow_html=True)
+        return
+    st.dataframe([{"Model": row["model"], "Metrik": row["distance_metric"],
+                   "Distance": round(row["distance"], 4) if row["error"] is None else None,
+                   "Threshold": round(row["threshold"], 4) if row["error"] is None else None,
+                   "Sumber Threshold": row.get("threshold_source"),
+                   "Cocok": ("✅" if row["verified"] else "❌") if row["error"] is None else row["error"],
+                   "Load Model (ms)": row["load_ms"], "Embedding (ms)": row["embedding_ms"]} for row in sweep_result["results"]],
+                 use_container_width=True, hide_index=True)
+    st.caption(f"Total {sweep_result['time']:.2f} dtk. Load model dihitung terpisah dari embedding; "
+               "embedding yang sudah ada di cache tercatat mendekati 0 ms.")
+
+if st.session_state.app_mode == MODE_IDENTIFY:
+    render_identify_mode()
+    st.stop()
+if st.session_state.app_mode == MODE_SWEEP:
+    render_sweep_mode()
+    st.stop()
+
 # --- Logika Tombol Analisis (Sama) ---
 if st.session_state.analysis_button_clicked:
     st.session_state.similarity_result = None; st.session_state.img1_attributes = None; st.session_state.img2_attributes = None
-    can_analyze_img1 = st.session_state.img1_cropped_bytes is not None; can_analyze_img2 = st.session_state.img2_cropped_bytes is not None
+    can_analyze_img1 = st.session_state.img1_face_record is not None; can_analyze_img2 = st.session_state.img2_face_record is not None
     if not can_analyze_img1 and not can_analyze_img2: st.warning("Tidak ada wajah yang berhasil di-extract untuk dianalisis.")
     else:
         with st.spinner(f"Menganalisis..."):
             model, detector, metric = st.session_state.selected_model, st.session_state.selected_detector, st.session_state.selected_distance_metric
-            if can_analyze_img1: st.session_state.img1_attributes = analyze_face_attributes(st.session_state.img1_cropped_bytes, detector)
-            if can_analyze_img2: st.session_state.img2_attributes = analyze_face_attributes(st.session_state.img2_cropped_bytes, detector)
-            if can_analyze_img1 and can_analyze_img2: st.session_state.similarity_result = verify_images(st.session_state.img1_cropped_bytes, st.session_state.img2_cropped_bytes, model, detector, metric)
+            actions = selected_actions()
+            # Atribut semua wajah per gambar dihitung sebagai satu batch
+            if can_analyze_img1 and actions: st.session_state.img1_attributes = analyze_face_attributes(st.session_state.img1_face_records, detector, actions)
+            if can_analyze_img2 and actions: st.session_state.img2_attributes = analyze_face_attributes(st.session_state.img2_face_records, detector, actions)
+            if can_analyze_img1 and can_analyze_img2:
+                # Embedding semua wajah kedua gambar dalam satu batch; ganti pilihan wajah cukup membaca cache
+                similarity_profiler = StageProfiler()
+                try:
+                    with similarity_profiler.stage("embedding"):
+                        represent_records_batch(st.session_state.img1_face_records + st.session_state.img2_face_records, model)
+                except Exception as e:
+                    st.warning(f"Embedding batch gagal, wajah terpilih dihitung satu per satu: {type(e).__name__} - {e}")
+                st.session_state.similarity_result = verify_images(st.session_state.img1_face_record, st.session_state.img2_face_record, model, detector, metric,
+                                                                   profiler=similarity_profiler)
 
 # --- Fungsi untuk menampilkan atribut wajah (Sama) ---
 def display_attributes_section(attributes_data, image_number_str):
     if attributes_data:
         if attributes_data.get("error"): st.markdown(f"<div class='error-message-custom'>Atribut Gbr {image_number_str}: {attributes_data['error']}</div>", unsafe_allow_html=True)
         elif attributes_data.get("data") and len(attributes_data["data"]) > 0:
-            face_data = attributes_data["data"][0]
-            age, emotion, gender, race = face_data.get('age','N/A'), face_data.get('dominant_emotion','N/A').capitalize(), face_data.get('dominant_gender','N/A').capitalize(), face_data.get('dominant_race','N/A').capitalize()
-            st.markdown(f"Umur: {age} | Emosi: {emotion}")
-            st.markdown(f"Gender: {gender} | Ras: {race}")
-            if len(attributes_data["data"]) > 1: st.caption(f"(Info untuk wajah pertama dari {len(attributes_data['data'])} wajah)")
+            faces = attributes_data["data"]
+            selected_index = st.session_state[f'img{image_number_str}_face_index']
+            for i, face_data in enumerate(faces):
+                values = {'age': face_data.get('age'), 'emotion': face_data.get('dominant_emotion'),
+                          'gender': face_data.get('dominant_gender'), 'race': face_data.get('dominant_race')}
+                parts = [f"{ACTION_LABELS[action]}: {str(values[action]).capitalize()}" for action in ANALYZE_ACTIONS if values[action] is not None]
+                prefix = f"**Wajah {i + 1}{' (dibandingkan)' if i == selected_index else ''}** — " if len(faces) > 1 else ""
+                st.markdown(prefix + (" | ".join(parts) if parts else "Tidak ada atribut yang dipilih."))
         else: st.info(f"Atribut Gbr {image_number_str}: Data tidak valid atau wajah tidak terdeteksi.")
 
+# --- Panel Performa: breakdown waktu & memori per tahap untuk run saat ini ---
+def collect_performance_rows():
+    sources = [("Ekstraksi Gbr 1", st.session_state.img1_timings), ("Ekstraksi Gbr 2", st.session_state.img2_timings),
+               ("Atribut Gbr 1", (st.session_state.img1_attributes or {}).get("timings")),
+               ("Atribut Gbr 2", (st.session_state.img2_attributes or {}).get("timings")),
+               ("Similaritas", (st.session_state.similarity_result or {}).get("timings"))]
+    return [{"Langkah": step, "Tahap": t["stage"], "Waktu (ms)": t["time_ms"], "Δ RSS (MB)": t["rss_delta_mb"], "RSS (MB)": t["rss_mb"]}
+            for step, timings in sources for t in (timings or [])]
+
+def display_performance_panel():
+    rows = collect_performance_rows()
+    if not rows:
+        st.info("Belum ada data performa untuk run ini.")
+        return
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    st.caption(f"Total: {sum(r['Waktu (ms)'] for r in rows):.1f} ms. Embedding yang diambil dari cache hanya mencatat tahap lookup.")
+
 # --- Area Tampilan Gambar & Atribut (Penyesuaian kolom dan judul) ---
 st.markdown("<hr class='styled-hr'>", unsafe_allow_html=True)
 st.markdown("<h2 class='section-title'>🔬 Tampilan Gambar & Atribut Wajah</h2>", unsafe_allow_html=True)
@@ -204,25 +425,26 @@ with main_cols[0]:
     st.markdown(f"<h3 class='image-pair-title'>👤 Gambar 1: {st.session_state.img1_name or 'Belum Diunggah'}</h3>", unsafe_allow_html=True)
     if st.session_state.img1_bytes_original:
         # Tampilkan Asli dan Crop dalam sub-kolom jika keduanya ada, atau satu per satu jika hanya asli
-        if st.session_state.img1_cropped_bytes:
+        if st.session_state.img1_face_record:
             sub_cols1 = st.columns(2)
             with sub_cols1[0]:
                 st.markdown("<h6>Gambar Asli</h6>", unsafe_allow_html=True)
-                img_pil = Image.open(io.BytesIO(st.session_state.img1_bytes_original))
-                if st.session_state.img1_original_region:
-                    draw = ImageDraw.Draw(img_pil); r = st.session_state.img1_original_region
-                    draw.rectangle([r['x'], r['y'], r['x'] + r['w'], r['y'] + r['h']], outline="#66BB6A", width=5)
+                img_pil = draw_face_boxes(st.session_state.img1_thumbnail, st.session_state.img1_image_size, st.session_state.img1_face_records, st.session_state.img1_face_index)
                 st.image(img_pil, use_container_width=True) 
             with sub_cols1[1]:
                 st.markdown("<h6>Wajah (Crop & Align)</h6>", unsafe_allow_html=True)
-                st.image(st.session_state.img1_cropped_bytes, use_container_width=True)
+                st.image(st.session_state.img1_face_record.rgb_uint8, use_container_width=True)
+            if len(st.session_state.img1_face_records) > 1:
+                st.selectbox(f"{len(st.session_state.img1_face_records)} wajah terdeteksi — pilih wajah yang dibandingkan:",
+                             range(len(st.session_state.img1_face_records)), format_func=lambda i: f"Wajah {i + 1}",
+                             key="img1_face_index", on_change=select_face, args=("img1",))
         else: # Hanya tampilkan gambar asli jika crop gagal atau belum ada
             st.markdown("<h6>Gambar Asli</h6>", unsafe_allow_html=True)
-            img_pil_orig_only = Image.open(io.BytesIO(st.session_state.img1_bytes_original))
+            img_pil_orig_only = st.session_state.img1_bytes_original if st.session_state.img1_thumbnail is None else Image.fromarray(st.session_state.img1_thumbnail[:, :, ::-1])
             st.image(img_pil_orig_only, use_container_width=True)
             if st.session_state.analysis_button_clicked: st.warning("Ekstraksi wajah untuk Gambar 1 gagal.")
 
-        if st.session_state.img1_attributes and st.session_state.img1_cropped_bytes: 
+        if st.session_state.img1_attributes and st.session_state.img1_face_record: 
             with st.expander("🔍 Lihat Atribut Gambar 1", expanded=True): 
                 display_attributes_section(st.session_state.img1_attributes, "1")
     else: 
@@ -232,25 +454,26 @@ with main_cols[0]:
 with main_cols[1]: 
     st.markdown(f"<h3 class='image-pair-title'>👤 Gambar 2: {st.session_state.img2_name or 'Belum Diunggah'}</h3>", unsafe_allow_html=True)
     if st.session_state.img2_bytes_original:
-        if st.session_state.img2_cropped_bytes:
+        if st.session_state.img2_face_record:
             sub_cols2 = st.columns(2)
             with sub_cols2[0]:
                 st.markdown("<h6>Gambar Asli</h6>", unsafe_allow_html=True)
-                img_pil = Image.open(io.BytesIO(st.session_state.img2_bytes_original))
-                if st.session_state.img2_original_region:
-                    draw = ImageDraw.Draw(img_pil); r = st.session_state.img2_original_region
-                    draw.rectangle([r['x'], r['y'], r['x'] + r['w'], r['y'] + r['h']], outline="#66BB6A", width=5)
+                img_pil = draw_face_boxes(st.session_state.img2_thumbnail, st.session_state.img2_image_size, st.session_state.img2_face_records, st.session_state.img2_face_index)
                 st.image(img_pil, use_container_width=True)
             with sub_cols2[1]:
                 st.markdown("<h6>Wajah (Crop & Align)</h6>", unsafe_allow_html=True)
-                st.image(st.session_state.img2_cropped_bytes, use_container_width=True)
+                st.image(st.session_state.img2_face_record.rgb_uint8, use_container_width=True)
+            if len(st.session_state.img2_face_records) > 1:
+                st.selectbox(f"{len(st.session_state.img2_face_records)} wajah terdeteksi — pilih wajah yang dibandingkan:",
+                             range(len(st.session_state.img2_face_records)), format_func=lambda i: f"Wajah {i + 1}",
+                             key="img2_face_index", on_change=select_face, args=("img2",))
         else: # Hanya tampilkan gambar asli jika crop gagal
             st.markdown("<h6>Gambar Asli</h6>", unsafe_allow_html=True)
-            img_pil_orig_only_2 = Image.open(io.BytesIO(st.session_state.img2_bytes_original))
+            img_pil_orig_only_2 = st.session_state.img2_bytes_original if st.session_state.img2_thumbnail is None else Image.fromarray(st.session_state.img2_thumbnail[:, :, ::-1])
             st.image(img_pil_orig_only_2, use_container_width=True)
             if st.session_state.analysis_button_clicked: st.warning("Ekstraksi wajah untuk Gambar 2 gagal.")
 
-        if st.session_state.img2_attributes and st.session_state.img2_cropped_bytes:
+        if st.session_state.img2_attributes and st.session_state.img2_face_record:
             with st.expander("🔍 Lihat Atribut Gambar 2", expanded=True): 
                 display_attributes_section(st.session_state.img2_attributes, "2")
     else: 
@@ -259,7 +482,7 @@ with main_cols[1]:
 
 # --- Area Tampilan Hasil Similaritas (Sama) ---
 # ... (Kode ini tidak berubah signifikan dari versi sebelumnya)
-if st.session_state.img1_cropped_bytes and st.session_state.img2_cropped_bytes:
+if st.session_state.img1_face_record and st.session_state.img2_face_record:
     st.markdown("<hr class='styled-hr'>", unsafe_allow_html=True)
     st.markdown("<h2 class='section-title'>⚖ Hasil Analisis Similaritas</h2>", unsafe_allow_html=True)
     results_placeholder_bottom = st.container()
@@ -272,8 +495,14 @@ if st.session_state.img1_cropped_bytes and st.session_state.img2_cropped_bytes:
                 model, detector, metric = result_sim.get("model_name_used", "N/A"), result_sim.get("detector_backend_used", "N/A"), result_sim.get("distance_metric_used", "N/A")
                 if verified: st.markdown(f"<div class='success-message'>✅ Wajah Terverifikasi Mirip! (Distance: {dist:.4f} ≤ Threshold: {thres:.2f})</div>", unsafe_allow_html=True)
                 else: st.markdown(f"<div class='warning-message'>❌ Tidak Mirip. (Distance: {dist:.4f} > Threshold: {thres:.2f})</div>", unsafe_allow_html=True)
-                with st.expander("Detail Konfigurasi Similaritas"):
-                    st.markdown(f"- Model: {model}\n- Detektor Awal: {st.session_state.selected_detector}\n- Metrik: {metric}")
+                detail_cols = st.columns(2)
+                with detail_cols[0]:
+                    with st.expander("Detail Konfigurasi Similaritas"):
+                        threshold_source = "terkalibrasi" if result_sim.get("threshold_source") == "calibrated" else "bawaan DeepFace"
+                        st.markdown(f"- Model: {model}\n- Detektor Awal: {st.session_state.selected_detector}\n- Metrik: {metric}\n- Threshold: {thres:.4f} ({threshold_source})")
+                with detail_cols[1]:
+                    with st.expander("⏱ Performa"):
+                        display_performance_panel()
         elif st.session_state.analysis_button_clicked: st.info("Proses similaritas belum menghasilkan data atau gagal.")
 elif st.session_state.analysis_button_clicked and (st.session_state.img1_bytes_original or st.session_state.img2_bytes_original):
     st.markdown("<hr class='styled-hr'>", unsafe_allow_html=True)
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+
+from src.face_processing.batch import BATCH_TASKS, iter_image_paths, iter_pairs, run_batch
+
+# Sama dengan core.ANALYZE_ACTIONS; tidak diimpor dari core agar proses utama tidak memuat TensorFlow
+ANALYZE_ACTIONS = ['age', 'emotion', 'gender', 'race']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pemrosesan batch wajah (ekstraksi, atribut, embedding, verifikasi pasangan).")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Direktori gambar (rekursif) atau file manifest berisi satu path per baris.")
+    source.add_argument("--pairs", help="File pasangan 'path1,path2' per baris untuk verifikasi.")
+    parser.add_argument("--output", required=True, help="File hasil .jsonl, atau direktori .parquet (part per chunk).")
+    parser.add_argument("--tasks", default="extract,represent", help=f"Tugas per gambar, dipisah koma: {', '.join(BATCH_TASKS)}.")
+    parser.add_argument("--model", default="VGG-Face", help="Model similaritas/embedding.")
+    parser.add_argument("--detector", default="opencv", help="Detektor wajah.")
+    parser.add_argument("--actions", default=",".join(ANALYZE_ACTIONS), help="Aksi atribut untuk tugas 'analyze', dipisah koma.")
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "euclidean", "euclidean_l2"], help="Metrik jarak untuk --pairs.")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Jumlah proses worker.")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Jumlah gambar/pasangan per chunk (= ukuran batch inferensi).")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Batas thread TensorFlow/OpenMP per worker.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    unknown = [t for t in tasks if t not in BATCH_TASKS]
+    if unknown:
+        print(f"Tugas tidak dikenal: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    actions = [a.strip() for a in args.actions.split(",") if a.strip()]
+    unknown = [a for a in actions if a not in ANALYZE_ACTIONS]
+    if unknown:
+        print(f"Aksi atribut tidak dikenal: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    if args.threads_per_worker:
+        # Diwarisi proses worker (spawn) sebelum TensorFlow diimpor di sana
+        for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+            os.environ[var] = str(args.threads_per_worker)
+        os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    config = {"tasks": tasks, "model_name": args.model, "detector_backend": args.detector,
+              "distance_metric": args.metric, "actions": actions}
+    if args.pairs:
+        items, key_field = iter_pairs(args.pairs), "pair"
+    else:
+        items, key_field = iter_image_paths(args.input), "path"
+    run_batch(items, args.output, config, workers=args.workers, chunk_size=args.chunk_size, key_field=key_field)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
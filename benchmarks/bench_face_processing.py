@@ -0,0 +1,275 @@
+"""
+Benchmark CPU untuk jalur utama src/face_processing: cold start, latensi warm, dan throughput per detektor
+dan per model similaritas, plus alur lengkap extract -> analyze -> verify. Input berasal dari
+data/sample_images ditambah varian sintetis yang di-resize (deterministik). Hasil ditulis sebagai JSON
+agar bisa dibandingkan antar commit:
+
+    python benchmarks/bench_face_processing.py --output bench.json
+    python benchmarks/bench_face_processing.py --output new.json --compare bench.json --tolerance 0.15
+
+Dengan --compare, proses keluar dengan kode 1 bila ada metrik yang memburuk melebihi toleransi.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DIR = os.path.join(REPO_ROOT, "data", "sample_images")
+# Sisi terpanjang varian sintetis (piksel); mencakup thumbnail sampai foto ponsel
+SYNTHETIC_LONG_SIDES = (480, 1280, 2560, 4000)
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def summarize(seconds):
+    """Ringkasan latensi dalam milidetik."""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {"n": int(ms.size), "mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)), "min_ms": float(ms.min()), "max_ms": float(ms.max())}
+
+
+def time_calls(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(repeats):
+        tic = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - tic)
+    return durations
+
+
+def load_inputs():
+    """Sample asli + varian resize sintetis: list (nama, bytes, array BGR)."""
+    import cv2
+    from src.face_processing.core import decode_image_bytes
+    inputs = []
+    for name in sorted(os.listdir(SAMPLE_DIR)):
+        with open(os.path.join(SAMPLE_DIR, name), "rb") as f:
+            img_bytes = f.read()
+        img = decode_image_bytes(img_bytes)
+        inputs.append((name, img_bytes, img))
+        for long_side in SYNTHETIC_LONG_SIDES:
+            scale = long_side / max(img.shape[:2])
+            resized = cv2.resize(img, (round(img.shape[1] * scale), round(img.shape[0] * scale)),
+                                 interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+            ok, encoded = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, 92])
+            inputs.append((f"{os.path.splitext(name)[0]}@{long_side}", encoded.tobytes(), resized))
+    return inputs
+
+
+def cold_start(task, model_name):
+    """Cold start diukur di proses baru: import, load bobot, dan inferensi pertama."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child-cold-start", task, model_name]
+    completed = subprocess.run(cmd, capture_output=True, text=True, cwd=REPO_ROOT)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return {"error": (completed.stderr or "tidak ada output").strip().splitlines()[-1:]}
+
+
+def child_cold_start(task, model_name):
+    tic = time.perf_counter()
+    from src.face_processing.model_registry import ModelRegistry
+    import_s = time.perf_counter() - tic
+    registry = ModelRegistry()
+    tic = time.perf_counter()
+    model = registry.get(task, model_name)
+    load_s = time.perf_counter() - tic
+    tic = time.perf_counter()
+    registry.warmup(task, model_name, model)
+    first_inference_s = time.perf_counter() - tic
+    print(json.dumps({"import_s": import_s, "load_s": load_s, "first_inference_s": first_inference_s,
+                      "total_s": import_s + load_s + first_inference_s}))
+
+
+def bench_detectors(inputs, detectors, repeats, with_cold_start):
+    from src.face_processing.core import extract_face_record
+    from src.face_processing.model_registry import TASK_DETECTOR
+    results = {}
+    for detector in detectors:
+        entry = {}
+        if with_cold_start:
+            entry["cold_start"] = cold_start(TASK_DETECTOR, detector)
+        try:
+            per_input, all_durations = {}, []
+            for name, _, img in inputs:
+                durations = time_calls(lambda: extract_face_record(img, detector), repeats)
+                per_input[name] = summarize(durations)
+                all_durations += durations
+            entry["warm"] = per_input
+            entry["throughput_img_per_s"] = len(all_durations) / sum(all_durations)
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+        results[detector] = entry
+    return results
+
+
+def bench_models(records, models, repeats, batch_size, with_cold_start):
+    from src.face_processing.core import represent_records_batch
+    from src.face_processing.embedding_cache import EmbeddingCache
+    from src.face_processing.model_registry import TASK_RECOGNITION
+    # Cache berkapasitas 0: setiap panggilan benar-benar menjalankan inferensi
+    no_cache = EmbeddingCache(max_entries=0)
+    batch = [records[i % len(records)] for i in range(batch_size)]
+    results = {}
+    for model_name in models:
+        entry = {}
+        if with_cold_start:
+            entry["cold_start"] = cold_start(TASK_RECOGNITION, model_name)
+        try:
+            entry["warm_single"] = summarize(time_calls(lambda: represent_records_batch(records[:1], model_name, cache=no_cache), repeats))
+            durations = time_calls(lambda: represent_records_batch(batch, model_name, cache=no_cache), repeats)
+            entry["warm_batch"] = summarize(durations)
+            entry["throughput_img_per_s"] = batch_size * len(durations) / sum(durations)
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+        results[model_name] = entry
+    return results
+
+
+def bench_attributes(records, repeats, batch_size):
+    from src.face_processing.core import analyze_records_batch
+    from src.face_processing.attribute_cache import AttributeCache
+    # Seperti bench_models: cache berkapasitas 0 agar setiap panggilan menjalankan model atribut
+    no_cache = AttributeCache(max_entries=0)
+    batch = [records[i % len(records)] for i in range(batch_size)]
+    durations = time_calls(lambda: analyze_records_batch(batch, cache=no_cache), repeats)
+    return {"warm_single": summarize(time_calls(lambda: analyze_records_batch(records[:1], cache=no_cache), repeats)),
+            "warm_batch": summarize(durations), "throughput_img_per_s": batch_size * len(durations) / sum(durations)}
+
+
+def bench_full_flow(inputs, model_name, detector, repeats):
+    """Alur satu klik di app.py: extract kedua gambar, analyze keduanya, lalu verify (cache dikosongkan tiap putaran)."""
+    from src.face_processing.core import extract_face_record, analyze_face_attributes, verify_images
+    from src.face_processing.embedding_cache import get_embedding_cache
+    from src.face_processing.attribute_cache import get_attribute_cache
+    img1, img2 = inputs[0][2], inputs[len(inputs) // 2][2]
+
+    def flow():
+        get_embedding_cache().clear()
+        get_attribute_cache().clear()
+        records = [extract_face_record(img, detector)["record"] for img in (img1, img2)]
+        for record in records:
+            analyze_face_attributes(record)
+        verify_images(records[0], records[1], model_name, detector)
+
+    return {"model_name": model_name, "detector_backend": detector, "latency": summarize(time_calls(flow, repeats))}
+
+
+def environment_info():
+    info = {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+    try:
+        info["git_commit"] = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                            cwd=REPO_ROOT).stdout.strip() or None
+    except OSError:
+        info["git_commit"] = None
+    try:
+        import deepface
+        import tensorflow
+        info["deepface"] = getattr(deepface, "__version__", None)
+        info["tensorflow"] = tensorflow.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare_results(baseline, current, tolerance):
+    """Daftar regresi: latensi (p50/p95/total) naik atau throughput turun lebih dari 'tolerance'."""
+    base_flat, cur_flat = flatten(baseline["results"]), flatten(current["results"])
+    regressions = []
+    for key, cur in cur_flat.items():
+        base = base_flat.get(key)
+        if not base:
+            continue
+        if key.endswith(("p50_ms", "p95_ms", "total_s")) and cur > base * (1 + tolerance):
+            regressions.append({"metric": key, "baseline": base, "current": cur, "change": cur / base - 1})
+        elif key.endswith("throughput_img_per_s") and cur < base * (1 - tolerance):
+            regressions.append({"metric": key, "baseline": base, "current": cur, "change": cur / base - 1})
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CPU untuk src/face_processing.")
+    parser.add_argument("--output", default="bench_output.json", help="File JSON hasil benchmark.")
+    parser.add_argument("--detectors", default=None, help="Daftar detektor dipisah koma (default: semua di sidebar).")
+    parser.add_argument("--models", default=None, help="Daftar model dipisah koma (default: semua di sidebar).")
+    parser.add_argument("--repeats", type=int, default=5, help="Jumlah pengulangan per pengukuran warm.")
+    parser.add_argument("--batch-size", type=int, default=16, help="Ukuran batch untuk throughput embedding/atribut.")
+    parser.add_argument("--no-cold-start", action="store_true", help="Lewati pengukuran cold start (subprocess).")
+    parser.add_argument("--threads", type=int, default=None, help="Batasi thread TensorFlow/OpenMP agar hasil stabil.")
+    parser.add_argument("--compare", default=None, help="File JSON baseline untuk deteksi regresi.")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Toleransi regresi relatif (0.15 = 15%%).")
+    parser.add_argument("--child-cold-start", nargs=2, metavar=("TASK", "MODEL"), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.threads:
+        # Harus di-set sebelum TensorFlow diimpor; diwarisi juga oleh subprocess cold start
+        for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+            os.environ[var] = str(args.threads)
+        os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    if args.child_cold_start:
+        child_cold_start(*args.child_cold_start)
+        return 0
+
+    from src.face_processing.core import MODEL_NAMES, DETECTOR_BACKENDS, extract_face_record
+    detectors = args.detectors.split(",") if args.detectors else DETECTOR_BACKENDS
+    models = args.models.split(",") if args.models else MODEL_NAMES
+    inputs = load_inputs()
+    records = [r for r in (extract_face_record(img, "opencv")["record"] for _, _, img in inputs) if r is not None]
+    if not records:
+        print("Tidak ada wajah terdeteksi pada data/sample_images.", file=sys.stderr)
+        return 2
+
+    with_cold_start = not args.no_cold_start
+    report = {
+        "environment": environment_info(),
+        "config": {"repeats": args.repeats, "batch_size": args.batch_size, "threads": args.threads,
+                   "inputs": [{"name": name, "shape": list(img.shape)} for name, _, img in inputs]},
+        "results": {
+            "detectors": bench_detectors(inputs, detectors, args.repeats, with_cold_start),
+            "models": bench_models(records, models, args.repeats, args.batch_size, with_cold_start),
+            "attributes": bench_attributes(records, args.repeats, args.batch_size),
+            "full_flow": bench_full_flow(inputs, models[0], detectors[0], args.repeats),
+        },
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Hasil benchmark ditulis ke {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.tolerance)
+        for r in regressions:
+            print(f"REGRESI {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.1%})")
+        if regressions:
+            return 1
+        print("Tidak ada regresi melebihi toleransi.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+
+# Sama dengan utils.DISTANCE_METRICS; tidak diimpor agar --help tidak memuat TensorFlow
+DISTANCE_METRICS = ["cosine", "euclidean", "euclidean_l2"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Kalibrasi threshold verifikasi (ROC/EER) dari dataset berlabel dataset/<identitas>/<gambar>.")
+    parser.add_argument("--dataset", required=True, help="Direktori dengan satu subdirektori per identitas.")
+    parser.add_argument("--output", default="thresholds.json", help="File threshold hasil kalibrasi (dibaca via FP_AI_THRESHOLDS_FILE).")
+    parser.add_argument("--models", default="VGG-Face", help="Model embedding, dipisah koma.")
+    parser.add_argument("--metrics", default=",".join(DISTANCE_METRICS), help="Metrik jarak, dipisah koma.")
+    parser.add_argument("--detector", default="opencv", help="Detektor wajah.")
+    parser.add_argument("--target-far", type=float, default=None, help="Pilih threshold terbesar dengan FAR <= nilai ini (default: titik EER).")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Jumlah gambar per batch inferensi embedding.")
+    parser.add_argument("--block-size", type=int, default=2048, help="Ukuran blok matriks jarak (memori ~ blok² x 8 byte per metrik).")
+    parser.add_argument("--embeddings-dir", default=None, help="Simpan/pakai ulang embedding di direktori ini agar kalibrasi ulang tanpa inferensi.")
+    return parser.parse_args(argv)
+
+
+def _fmt(value, width):
+    return f"{value:>{width}.4f}" if value is not None else f"{'-':>{width}}"
+
+
+def print_report(thresholds, log=sys.stderr):
+    print(f"{'model':<12} {'metrik':<13} {'threshold':>9} {'FAR':>8} {'FRR':>8} {'EER':>8} {'AUC':>7} {'bawaan':>8} {'FAR bawaan':>10} {'FRR bawaan':>10}", file=log)
+    for model_name, metrics in thresholds.items():
+        for metric, r in metrics.items():
+            print(f"{model_name:<12} {metric:<13} {_fmt(r['threshold'], 9)} {_fmt(r['far'], 8)} {_fmt(r['frr'], 8)} {r['eer']:>8.4f} {r['auc']:>7.4f} "
+                  f"{r['deepface_threshold']:>8.4f} {r['deepface_far']:>10.4f} {r['deepface_frr']:>10.4f}", file=log)
+            if r["threshold"] is None:
+                print(f"  -> {r['criterion']} tidak tercapai untuk {model_name}/{metric}; tidak ditulis (tetap threshold bawaan).", file=log)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    model_names = [m.strip() for m in args.models.split(",") if m.strip()]
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    unknown = [m for m in metrics if m not in DISTANCE_METRICS]
+    if unknown:
+        print(f"Metrik tidak dikenal: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    if not os.path.isdir(args.dataset):
+        print(f"Direktori dataset tidak ditemukan: {args.dataset}", file=sys.stderr)
+        return 2
+    from src.face_processing.calibration import (
+        iter_identity_images, dataset_fingerprint, embed_dataset, save_embeddings, load_embeddings, calibrate, write_thresholds
+    )
+    items = list(iter_identity_images(args.dataset))
+    # Cache embedding hanya dipakai bila dataset (daftar file, ukuran, mtime) dan detektornya sama
+    manifest = {"dataset": dataset_fingerprint(items), "detector_backend": args.detector}
+    cached = load_embeddings(args.embeddings_dir, model_names, manifest) if args.embeddings_dir else None
+    failures = []
+    if cached is not None:
+        paths, identities, embeddings = cached
+        print(f"[kalibrasi] memakai embedding tersimpan di {args.embeddings_dir}", file=sys.stderr)
+    else:
+        from src.face_processing.model_registry import get_registry, default_preload_specs
+        get_registry().preload(list(dict.fromkeys(spec for m in model_names for spec in default_preload_specs(m, args.detector, []))))
+        paths, identities, embeddings, failures = embed_dataset(items, model_names, args.detector, chunk_size=args.chunk_size)
+        if args.embeddings_dir:
+            save_embeddings(args.embeddings_dir, paths, identities, embeddings, manifest)
+    if len(set(identities)) < 2 or len(identities) == len(set(identities)):
+        print("Dataset butuh minimal dua identitas dan satu identitas dengan lebih dari satu gambar.", file=sys.stderr)
+        return 2
+    thresholds = calibrate(embeddings, identities, metrics, target_far=args.target_far, block_size=args.block_size)
+    dataset_info = {"path": os.path.abspath(args.dataset), "images": len(paths), "identities": len(set(identities)),
+                    "failed_images": len(failures), "detector_backend": args.detector}
+    write_thresholds(args.output, thresholds, dataset_info)
+    print_report(thresholds)
+    print(f"[kalibrasi] threshold ditulis ke {args.output}; aktifkan dengan FP_AI_THRESHOLDS_FILE={args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import base64
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flask import Flask, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+from src.face_processing.core import (
+    extract_face_record, represent_records_batch, analyze_records_batch, verify_images, ANALYZE_ACTIONS, MODEL_NAMES,
+    DETECTOR_BACKENDS
+)
+from src.face_processing.micro_batch import MicroBatcher, QueueFullError
+from src.face_processing.model_registry import get_registry, default_preload_specs
+from src.face_processing.profiling import STAGE_METRICS
+from src.face_processing.utils import content_hash, DISTANCE_METRICS
+
+# Jalankan dengan SATU proses dan banyak thread agar request bisa digabung ke batch yang sama:
+#   gunicorn -w 1 -k gthread --threads 32 -b 0.0.0.0:8000 server:app
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+MAX_BATCH_SIZE = _env_int("FP_AI_MAX_BATCH", 16)
+MAX_WAIT_MS = _env_float("FP_AI_MAX_WAIT_MS", 5)
+MAX_QUEUE = _env_int("FP_AI_MAX_QUEUE", 128)
+INFERENCE_WORKERS = _env_int("FP_AI_INFERENCE_WORKERS", 2)
+REQUEST_TIMEOUT_S = _env_float("FP_AI_REQUEST_TIMEOUT_S", 30)
+DEFAULT_MODEL = os.environ.get("FP_AI_MODEL", "VGG-Face")
+DEFAULT_DETECTOR = os.environ.get("FP_AI_DETECTOR", "opencv")
+# Aksi atribut yang dimuat saat start; aksi lain baru dimuat saat pertama kali diminta
+PRELOAD_ACTIONS = [a for a in os.environ.get("FP_AI_ACTIONS", ",".join(ANALYZE_ACTIONS)).split(",") if a]
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _detect_batch(detector_backend, payloads):
+    # Detektor DeepFace memproses satu gambar per panggilan; batcher tetap membatasi konkurensinya
+    return [extract_face_record(img_bytes, detector_backend, source_hash=content_hash(img_bytes)) for img_bytes in payloads]
+
+
+detect_batcher = MicroBatcher(_detect_batch, name="detect", max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                              max_queue=MAX_QUEUE, num_workers=INFERENCE_WORKERS)
+embed_batcher = MicroBatcher(lambda model_name, records: represent_records_batch(records, model_name), name="embed",
+                             max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE, num_workers=INFERENCE_WORKERS)
+analyze_batcher = MicroBatcher(lambda actions, records: analyze_records_batch(records, list(actions)), name="analyze",
+                               max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE, num_workers=INFERENCE_WORKERS)
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """Region/confidence dari DeepFace bisa berupa tipe numpy; ubah ke tipe Python saat serialisasi."""
+
+    @staticmethod
+    def default(o):
+        if hasattr(o, "tolist"):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+
+def _wait_all(futures):
+    """
+    Menunggu beberapa Future; bila timeout, sisa item dibatalkan agar tidak membebani antrian.
+    Exception dari inferensi dibalas sebagai error JSON 500, bukan halaman error HTML bawaan Flask.
+    """
+    try:
+        return [future.result(timeout=REQUEST_TIMEOUT_S) for future in futures]
+    except FutureTimeoutError:
+        for future in futures:
+            future.cancel()
+        raise
+    except Exception as e:
+        raise RequestError(f"Inferensi gagal: {type(e).__name__} - {e}", status=500) from e
+
+
+def _run(batcher, key, payload):
+    return _wait_all([batcher.submit(key, payload)])[0]
+
+
+def _params():
+    return request.get_json(silent=True) or request.form
+
+
+def _image_bytes(field):
+    """Gambar dari multipart (file 'field') atau JSON (string base64 / data URI pada key 'field')."""
+    uploaded = request.files.get(field)
+    if uploaded is not None:
+        return uploaded.read()
+    encoded = (request.get_json(silent=True) or {}).get(field)
+    if not encoded:
+        raise RequestError(f"Gambar '{field}' wajib diisi (multipart file atau base64 di JSON).")
+    if not isinstance(encoded, str):
+        raise RequestError(f"Gambar '{field}' harus berupa string base64.")
+    try:
+        return base64.b64decode(encoded.split(",", 1)[-1], validate=True)
+    except ValueError:
+        raise RequestError(f"Gambar '{field}' bukan base64 yang valid.")
+
+
+def _actions(params):
+    """Aksi atribut dari parameter 'actions' (list JSON atau string dipisah koma); default semua."""
+    actions = params.get("actions") or ANALYZE_ACTIONS
+    if isinstance(actions, str):
+        actions = [a.strip() for a in actions.split(",") if a.strip()]
+    if not isinstance(actions, (list, tuple)):
+        raise RequestError(f"'actions' harus list atau string dipisah koma. Pilihan: {ANALYZE_ACTIONS}.")
+    unknown = [a for a in actions if a not in ANALYZE_ACTIONS]
+    if unknown:
+        raise RequestError(f"Aksi tidak dikenal: {unknown}. Pilihan: {ANALYZE_ACTIONS}.")
+    return tuple(dict.fromkeys(actions))
+
+
+def _choice(params, name, default, choices):
+    """Parameter pilihan (model, detektor, metrik) yang divalidasi di awal agar nilai salah dibalas 400, bukan 500."""
+    value = params.get(name, default)
+    if value not in choices:
+        raise RequestError(f"{name} harus salah satu dari {list(choices)}.")
+    return value
+
+
+def _detect(img_bytes, detector_backend):
+    extract_res = _run(detect_batcher, detector_backend, img_bytes)
+    if extract_res["error"]:
+        raise RequestError(extract_res["error"], status=422)
+    return extract_res["record"]
+
+
+def create_app():
+    app = Flask(__name__)
+    app.json = NumpyJSONProvider(app)
+
+    @app.errorhandler(RequestError)
+    def handle_request_error(e):
+        return jsonify({"error": str(e)}), e.status
+
+    @app.errorhandler(QueueFullError)
+    def handle_overload(e):
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
+    @app.errorhandler(FutureTimeoutError)
+    def handle_timeout(e):
+        return jsonify({"error": f"Inferensi melebihi batas waktu {REQUEST_TIMEOUT_S} detik."}), 504
+
+    @app.get("/health")
+    def health():
+        return jsonify({"status": "ok"})
+
+    @app.get("/stats")
+    def stats():
+        return jsonify({
+            "batchers": {b.name: b.stats() for b in (detect_batcher, embed_batcher, analyze_batcher)},
+            "models": get_registry().stats(),
+            "stages": STAGE_METRICS.snapshot(),
+        })
+
+    @app.get("/metrics")
+    def metrics():
+        # Histogram latensi per tahap (decode, deteksi, embedding, atribut) dalam format teks Prometheus
+        return STAGE_METRICS.prometheus_text(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+    @app.post("/extract")
+    def extract():
+        tic = time.perf_counter()
+        params = _params()
+        detector_backend = _choice(params, "detector_backend", DEFAULT_DETECTOR, DETECTOR_BACKENDS)
+        record = _detect(_image_bytes("image"), detector_backend)
+        body = {"region": record.region, "confidence": record.confidence, "detector_backend": detector_backend}
+        if str(params.get("include_crop", "")).lower() in ("1", "true"):
+            body["face_png_base64"] = base64.b64encode(record.to_png_bytes()).decode("ascii")
+        body["time"] = round(time.perf_counter() - tic, 4)
+        return jsonify(body)
+
+    @app.post("/analyze")
+    def analyze():
+        tic = time.perf_counter()
+        params = _params()
+        detector_backend = _choice(params, "detector_backend", DEFAULT_DETECTOR, DETECTOR_BACKENDS)
+        actions = _actions(params)
+        record = _detect(_image_bytes("image"), detector_backend)
+        attributes = _run(analyze_batcher, actions, record)
+        return jsonify({"data": [attributes], "time": round(time.perf_counter() - tic, 4)})
+
+    @app.post("/verify")
+    def verify():
+        tic = time.perf_counter()
+        params = _params()
+        model_name = _choice(params, "model_name", DEFAULT_MODEL, MODEL_NAMES)
+        detector_backend = _choice(params, "detector_backend", DEFAULT_DETECTOR, DETECTOR_BACKENDS)
+        distance_metric = _choice(params, "distance_metric", "cosine", DISTANCE_METRICS)
+        # Kedua gambar masuk antrian bersamaan sehingga bisa berbagi batch deteksi & embedding
+        img1_bytes, img2_bytes = _image_bytes("img1"), _image_bytes("img2")
+        extract_results = _wait_all([detect_batcher.submit(detector_backend, b) for b in (img1_bytes, img2_bytes)])
+        for extract_res in extract_results:
+            if extract_res["error"]:
+                raise RequestError(extract_res["error"], status=422)
+        records = [extract_res["record"] for extract_res in extract_results]
+        # Embedding dihitung lewat batcher dan masuk cache bersama; verify_images lalu membacanya dari cache
+        # sehingga jarak, threshold (termasuk yang terkalibrasi), dan 'verified' sama persis dengan aplikasi
+        _wait_all([embed_batcher.submit(model_name, record) for record in records])
+        result = verify_images(records[0], records[1], model_name, detector_backend, distance_metric)
+        if result.get("error"):
+            raise RequestError(result["error"], status=500)
+        return jsonify({
+            "verified": result["verified"], "distance": result["distance"], "threshold": result["threshold"],
+            "threshold_source": result["threshold_source"], "model": model_name, "detector_backend": detector_backend,
+            "similarity_metric": distance_metric, "facial_areas": result["facial_areas"],
+            "time": round(time.perf_counter() - tic, 4),
+        })
+
+    return app
+
+
+if os.environ.get("FP_AI_PRELOAD", "1") == "1":
+    get_registry().preload(default_preload_specs(DEFAULT_MODEL, DEFAULT_DETECTOR, PRELOAD_ACTIONS), warmup=True)
+
+app = create_app()
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=_env_int("PORT", 8000), threaded=True)
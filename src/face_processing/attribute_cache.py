@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+
+class AttributeCache:
+    """
+    Cache LRU hasil atribut per wajah dan per aksi dengan kunci (FaceRecord.cache_id, aksi).
+    Karena setiap aksi disimpan terpisah, menambah aksi baru untuk wajah yang sama hanya
+    menjalankan model aksi tersebut; aksi yang sudah pernah dihitung dibaca dari cache.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, face_id, action):
+        """Field hasil aksi (mis. {'age': 31}) untuk wajah, atau None bila belum pernah dihitung."""
+        with self._lock:
+            fields = self._entries.get((face_id, action))
+            if fields is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((face_id, action))
+            self.hits += 1
+            return fields
+
+    def put(self, face_id, action, fields):
+        with self._lock:
+            self._entries[(face_id, action)] = fields
+            self._entries.move_to_end((face_id, action))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fields
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_attribute_cache():
+    """Cache atribut bersama untuk seluruh proses (dibuat saat pertama kali dipanggil)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AttributeCache()
+        return _default_cache
@@ -0,0 +1,311 @@
+# Pemrosesan batch offline: ekstraksi wajah, atribut, embedding, dan verifikasi pasangan untuk direktori
+# atau manifest berisi ratusan ribu gambar. Pekerjaan dibagi ke beberapa proses worker yang masing-masing
+# memuat model sekali; hasil ditulis bertahap (JSONL/Parquet) sehingga run yang terhenti bisa dilanjutkan.
+# DeepFace/TensorFlow sengaja tidak diimpor di proses utama; core.py baru diimpor di dalam worker.
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+BATCH_TASKS = ("extract", "analyze", "represent")
+
+_worker_config = None
+
+
+def iter_image_paths(source):
+    """Path gambar dari direktori (rekursif, terurut) atau file manifest (satu path per baris)."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+    else:
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith("#"):
+                    yield path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+
+def iter_pairs(pairs_file):
+    """Pasangan (path1, path2) dari file CSV/TSV/spasi dua kolom; baris '#' diabaikan."""
+    base_dir = os.path.dirname(os.path.abspath(pairs_file))
+    with open(pairs_file, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = [p.strip() for p in line.replace("\t", ",").split(",")] if ("," in line or "\t" in line) else line.split()
+            if len(parts) < 2:
+                continue
+            yield tuple(p if os.path.isabs(p) else os.path.join(base_dir, p) for p in parts[:2])
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _truncate_partial_line(path, block_size=65536):
+    """Membuang baris terakhir yang terpotong saat crash agar baris baru tidak tersambung ke sisa baris itu."""
+    if not os.path.isfile(path):
+        return
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+
+class ResultWriter:
+    """
+    Penulis hasil bertahap. '.jsonl' -> satu baris JSON per hasil (flush per chunk);
+    '.parquet' -> direktori berisi part-NNNNN.parquet per chunk (butuh pandas + pyarrow).
+    'done_keys()' membaca hasil yang sudah ada agar run bisa dilanjutkan setelah crash.
+    """
+
+    def __init__(self, output_path, key_field):
+        self.output_path = output_path
+        self.key_field = key_field
+        self.is_parquet = output_path.endswith(".parquet")
+        self._part_index = 0
+        if self.is_parquet:
+            try:
+                import pandas  # noqa: F401
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError("Output Parquet membutuhkan pandas dan pyarrow (pip install pandas pyarrow).") from e
+            os.makedirs(output_path, exist_ok=True)
+            self._part_index = len(glob.glob(os.path.join(output_path, "part-*.parquet")))
+            self._file = None
+        else:
+            _truncate_partial_line(output_path)
+            self._file = open(output_path, "a", encoding="utf-8")
+
+    def done_keys(self):
+        keys = set()
+        if self.is_parquet:
+            import pandas as pd
+            for part in sorted(glob.glob(os.path.join(self.output_path, "part-*.parquet"))):
+                keys.update(pd.read_parquet(part, columns=[self.key_field])[self.key_field].tolist())
+        elif os.path.isfile(self.output_path):
+            with open(self.output_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        keys.add(json.loads(line)[self.key_field])
+                    except (ValueError, KeyError):
+                        continue  # baris terakhir yang terpotong saat crash
+        return keys
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.is_parquet:
+            import pandas as pd
+            # Kolom bersarang (dict/list) disimpan sebagai string JSON agar skema antar part konsisten
+            flat_rows = [{k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in row.items()} for row in rows]
+            part_path = os.path.join(self.output_path, f"part-{self._part_index:05d}.parquet")
+            pd.DataFrame(flat_rows).to_parquet(f"{part_path}.tmp", index=False)
+            os.replace(f"{part_path}.tmp", part_path)
+            self._part_index += 1
+        else:
+            for row in rows:
+                self._file.write(json.dumps(row, default=_json_default) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _json_default(value):
+    # Nilai numpy (float32, int64, ndarray) dari DeepFace
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Tipe {type(value).__name__} tidak bisa diserialisasi ke JSON")
+
+
+def _init_worker(config):
+    """Initializer tiap proses worker: simpan konfigurasi lalu muat & warmup model satu kali."""
+    global _worker_config
+    _worker_config = config
+    from src.face_processing.model_registry import get_registry, default_preload_specs
+    actions = config["actions"] if "analyze" in config["tasks"] else []
+    get_registry().preload(default_preload_specs(config["model_name"], config["detector_backend"], actions), warmup=True)
+
+
+def _extract_records(paths, detector_backend):
+    """Baca bytes dan deteksi wajah per path; mengembalikan {path: (record, error)}. Galat per gambar tidak dilempar."""
+    from src.face_processing.core import extract_face_record
+    results = {}
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                img_bytes = f.read()
+            extract_res = extract_face_record(img_bytes, detector_backend)
+            results[path] = (extract_res["record"], extract_res["error"])
+        except OSError as e:
+            results[path] = (None, f"Gagal membaca file: {e}")
+        except Exception as e:
+            results[path] = (None, f"Proses extract wajah gagal: {type(e).__name__} - {e}")
+    return results
+
+
+def _run_batched(fn, records):
+    """
+    fn(list record) -> list hasil, dijalankan sekali untuk seluruh chunk. Bila batch gagal, setiap record
+    dicoba sendiri sehingga hanya gambar bermasalah yang mendapat galat. Mengembalikan list (hasil, galat).
+    """
+    try:
+        return [(result, None) for result in fn(records)]
+    except Exception:
+        outcomes = []
+        for record in records:
+            try:
+                outcomes.append((fn([record])[0], None))
+            except Exception as e:
+                outcomes.append((None, f"{type(e).__name__} - {e}"))
+        return outcomes
+
+
+def _process_image_chunk(paths):
+    """Memproses satu chunk gambar di worker; atribut dan embedding masing-masing dijalankan sebagai satu batch."""
+    from src.face_processing.core import analyze_records_batch, represent_records_batch
+    config = _worker_config
+    extracted = _extract_records(paths, config["detector_backend"])
+    rows = []
+    for path in paths:
+        record, error = extracted[path]
+        row = {"path": path, "model_name": config["model_name"], "detector_backend": config["detector_backend"], "error": error}
+        if record is not None:
+            row["region"] = record.region
+            row["confidence"] = record.confidence
+        rows.append(row)
+    valid = [(row, extracted[row["path"]][0]) for row in rows if extracted[row["path"]][0] is not None]
+    if valid and "analyze" in config["tasks"]:
+        outcomes = _run_batched(lambda records: analyze_records_batch(records, config["actions"]), [record for _, record in valid])
+        for (row, _), (attributes, error) in zip(valid, outcomes):
+            row["attributes"] = attributes
+            row["error"] = f"Analisis atribut gagal: {error}" if error else None
+    if valid and "represent" in config["tasks"]:
+        outcomes = _run_batched(lambda records: represent_records_batch(records, config["model_name"]), [record for _, record in valid])
+        for (row, _), (embedding, error) in zip(valid, outcomes):
+            if error:
+                row["error"] = f"Embedding gagal: {error}"
+            else:
+                row["embedding"] = embedding.tolist()
+    return rows
+
+
+def _process_pair_chunk(pairs):
+    """Verifikasi satu chunk pasangan: gambar unik dideteksi sekali, embedding dihitung dalam satu batch."""
+    from src.face_processing.core import represent_records_batch
+    from src.face_processing.utils import find_distance
+    from src.face_processing.thresholds import resolve_threshold
+    config = _worker_config
+    unique_paths = list(dict.fromkeys(path for pair in pairs for path in pair))
+    extracted = _extract_records(unique_paths, config["detector_backend"])
+    valid_paths = [path for path in unique_paths if extracted[path][0] is not None]
+    outcomes = _run_batched(lambda records: represent_records_batch(records, config["model_name"]),
+                            [extracted[p][0] for p in valid_paths]) if valid_paths else []
+    embeddings = {}
+    for path, (embedding, error) in zip(valid_paths, outcomes):
+        if error:
+            extracted[path] = (None, f"Embedding gagal: {error}")
+        else:
+            embeddings[path] = embedding
+    threshold, _ = resolve_threshold(config["model_name"], config["distance_metric"])
+    rows = []
+    for path1, path2 in pairs:
+        row = {"pair": f"{path1}|{path2}", "img1": path1, "img2": path2, "model_name": config["model_name"],
+               "detector_backend": config["detector_backend"], "distance_metric": config["distance_metric"], "error": None}
+        errors = [f"{p}: {extracted[p][1]}" for p in (path1, path2) if p not in embeddings]
+        if errors:
+            row["error"] = "; ".join(errors)
+        else:
+            distance = find_distance(embeddings[path1], embeddings[path2], config["distance_metric"])
+            row.update({"distance": distance, "threshold": threshold, "verified": distance <= threshold})
+        rows.append(row)
+    return rows
+
+
+def _failed_chunk_rows(chunk, key_field, error):
+    """Baris galat untuk chunk yang worker-nya gagal total, agar chunk tercatat selesai dan tidak diulang saat resume."""
+    if key_field == "pair":
+        return [{"pair": f"{path1}|{path2}", "img1": path1, "img2": path2, "error": error} for path1, path2 in chunk]
+    return [{"path": path, "error": error} for path in chunk]
+
+
+def run_batch(items, output_path, config, workers=1, chunk_size=32, key_field="path", log_every_s=10.0, log=sys.stderr):
+    """
+    Menjalankan chunk 'items' (path gambar atau pasangan) di pool proses dan menulis hasil bertahap.
+    Item yang sudah ada di output dilewati (resume). Mengembalikan ringkasan throughput.
+    """
+    writer = ResultWriter(output_path, key_field)
+    done = writer.done_keys()
+    is_pairs = key_field == "pair"
+    item_key = (lambda pair: f"{pair[0]}|{pair[1]}") if is_pairs else (lambda path: path)
+    pending_items = (item for item in items if item_key(item) not in done)
+    process_chunk = _process_pair_chunk if is_pairs else _process_image_chunk
+
+    processed, failed, skipped = 0, 0, len(done)
+    tic = last_log = time.perf_counter()
+    # 'spawn' agar setiap worker menginisialisasi TensorFlow sendiri (TF tidak aman di-fork)
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(config,)) as pool:
+            in_flight = {}
+
+            def collect(finished):
+                nonlocal processed, failed
+                for future in finished:
+                    chunk = in_flight.pop(future)
+                    try:
+                        rows = future.result()
+                    except Exception as e:
+                        rows = _failed_chunk_rows(chunk, key_field, f"Chunk gagal diproses: {type(e).__name__} - {e}")
+                    writer.write(rows)
+                    processed += len(rows)
+                    failed += sum(1 for row in rows if row.get("error"))
+
+            chunks = chunked(pending_items, chunk_size)
+            # Batasi jumlah chunk yang sedang berjalan agar memori tetap konstan untuk input sangat besar
+            max_in_flight = workers * 2
+            for chunk in chunks:
+                in_flight[pool.submit(process_chunk, chunk)] = chunk
+                if len(in_flight) < max_in_flight:
+                    continue
+                collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                if time.perf_counter() - last_log >= log_every_s:
+                    last_log = time.perf_counter()
+                    elapsed = last_log - tic
+                    print(f"[batch] {processed} item ({processed / elapsed:.2f} item/s), gagal {failed}", file=log, flush=True)
+            collect(wait(in_flight).done)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - tic
+    summary = {"processed": processed, "failed": failed, "skipped_resume": skipped, "elapsed_s": round(elapsed, 2),
+               "items_per_s": round(processed / elapsed, 2) if elapsed > 0 else 0.0}
+    print(f"[batch] selesai: {json.dumps(summary)}", file=log, flush=True)
+    return summary
@@ -0,0 +1,233 @@
+# Kalibrasi threshold verifikasi dari dataset berlabel (dataset/<identitas>/<gambar>). Setiap gambar dideteksi
+# sekali dan di-embed sekali per model; jarak semua pasangan dihitung per blok matriks (NumPy, tanpa loop O(n²)
+# di Python) dan langsung diakumulasikan ke histogram genuine/impostor sehingga memori tetap konstan walau
+# datasetnya puluhan ribu gambar. Dari histogram dihitung ROC, EER, dan threshold per model & metrik.
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from src.face_processing.batch import IMAGE_EXTENSIONS, chunked, _run_batched
+from src.face_processing.utils import pairwise_distances, DISTANCE_METRICS
+
+# Resolusi histogram jarak; threshold terpilih akurat sampai lebar satu bin (mis. 1e-4 untuk cosine)
+HISTOGRAM_BINS = 20000
+
+
+def iter_identity_images(dataset_dir):
+    """(path, identitas) untuk setiap gambar di dataset_dir/<identitas>/...; urutan deterministik."""
+    for identity in sorted(os.listdir(dataset_dir)):
+        identity_dir = os.path.join(dataset_dir, identity)
+        if not os.path.isdir(identity_dir):
+            continue
+        for root, dirs, files in os.walk(identity_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name), identity
+
+
+def embed_dataset(items, model_names, detector_backend="opencv", chunk_size=64, log=sys.stderr):
+    """
+    Deteksi sekali per gambar lalu embedding per model dalam batch per chunk. Crop tidak disimpan setelah
+    chunk selesai. Bila batch embedding gagal, tiap gambar di chunk itu dicoba sendiri; gambar yang gagal di
+    salah satu model dicatat di 'failures' dan tidak masuk label maupun matriks sehingga barisnya tetap sejajar.
+    Mengembalikan (paths, identities, {model: array (n, d) float32}, failures).
+    """
+    from src.face_processing.core import extract_face_record, represent_records_batch
+    from src.face_processing.embedding_cache import EmbeddingCache
+    # Setiap gambar hanya di-embed sekali; cache bersama tidak perlu diisi puluhan ribu entri
+    no_cache = EmbeddingCache(max_entries=0)
+    paths, identities, failures = [], [], []
+    embeddings = {model_name: [] for model_name in model_names}
+    tic = time.perf_counter()
+    for chunk in chunked(items, chunk_size):
+        extracted = []
+        for path, identity in chunk:
+            try:
+                with open(path, "rb") as f:
+                    extract_res = extract_face_record(f.read(), detector_backend)
+            except OSError as e:
+                extract_res = {"record": None, "error": f"Gagal membaca file: {e}"}
+            if extract_res["record"] is None:
+                failures.append({"path": path, "error": extract_res["error"]})
+                continue
+            extracted.append((path, identity, extract_res["record"]))
+        records = [record for _, _, record in extracted]
+        outcomes = {model_name: _run_batched(lambda batch, m=model_name: represent_records_batch(batch, m, cache=no_cache), records)
+                    for model_name in model_names} if records else {}
+        for i, (path, identity, _) in enumerate(extracted):
+            errors = [f"{m}: {outcomes[m][i][1]}" for m in model_names if outcomes[m][i][1]]
+            if errors:
+                failures.append({"path": path, "error": f"Embedding gagal: {'; '.join(errors)}"})
+                continue
+            paths.append(path)
+            identities.append(identity)
+            for model_name in model_names:
+                embeddings[model_name].append(outcomes[model_name][i][0])
+        print(f"[kalibrasi] {len(paths)} gambar ter-embed, gagal {len(failures)} "
+              f"({len(paths) / (time.perf_counter() - tic):.2f} gambar/s)", file=log, flush=True)
+    stacked = {m: np.stack(rows).astype(np.float32) if rows else np.zeros((0, 0), np.float32)
+               for m, rows in embeddings.items()}
+    return paths, identities, stacked, failures
+
+
+def dataset_fingerprint(items):
+    """Hash daftar (path, identitas, ukuran, mtime) dataset; berubah bila file ditambah, dihapus, atau diganti."""
+    hasher = hashlib.blake2b(digest_size=16)
+    for path, identity in items:
+        stat = os.stat(path)
+        hasher.update(f"{path}\0{identity}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return hasher.hexdigest()
+
+
+def save_embeddings(embeddings_dir, paths, identities, embeddings_by_model, manifest):
+    """
+    Menyimpan embedding per model (.npy) dan label agar kalibrasi bisa diulang tanpa inferensi. 'manifest'
+    ({"dataset": dataset_fingerprint, "detector_backend": ...}) dipakai load_embeddings untuk menolak cache basi.
+    """
+    os.makedirs(embeddings_dir, exist_ok=True)
+    for model_name, matrix in embeddings_by_model.items():
+        np.save(os.path.join(embeddings_dir, f"{model_name}.npy"), matrix)
+    manifest = dict(manifest, models=sorted(embeddings_by_model))
+    with open(os.path.join(embeddings_dir, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump({"manifest": manifest, "paths": paths, "identities": identities}, f)
+
+
+def load_embeddings(embeddings_dir, model_names, manifest):
+    """
+    Kebalikan save_embeddings. Mengembalikan None bila belum ada cache, dataset/detektor berbeda dari
+    'manifest', atau salah satu model belum tersimpan; pemanggil lalu menghitung ulang semuanya.
+    """
+    labels_path = os.path.join(embeddings_dir, "labels.json")
+    if not os.path.isfile(labels_path):
+        return None
+    with open(labels_path, encoding="utf-8") as f:
+        labels = json.load(f)
+    stored = labels.get("manifest") or {}
+    if any(stored.get(key) != value for key, value in manifest.items()) or not set(model_names) <= set(stored.get("models", [])):
+        return None
+    embeddings = {}
+    for model_name in model_names:
+        path = os.path.join(embeddings_dir, f"{model_name}.npy")
+        if not os.path.isfile(path):
+            return None
+        embeddings[model_name] = np.load(path, mmap_mode="r")
+    return labels["paths"], labels["identities"], embeddings
+
+
+def _distance_upper_bound(embeddings, distance_metric):
+    if distance_metric in ("cosine", "euclidean_l2"):
+        return 2.0
+    # Ketaksamaan segitiga: |a - b| <= |a| + |b|
+    return float(2 * np.linalg.norm(embeddings, axis=1).max()) or 1.0
+
+
+def pair_histograms(embeddings, identities, distance_metrics=DISTANCE_METRICS, block_size=2048, bins=HISTOGRAM_BINS):
+    """
+    Histogram jarak semua pasangan i < j, dipisah genuine (identitas sama) dan impostor, untuk beberapa metrik
+    sekaligus. Matriks dihitung per blok (block_size x block_size) sehingga memori O(block_size²), bukan O(n²).
+    Mengembalikan {metrik: (genuine_counts, impostor_counts, bin_edges)}.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    _, labels = np.unique(np.asarray(identities), return_inverse=True)
+    n = len(embeddings)
+    edges = {m: np.linspace(0.0, _distance_upper_bound(embeddings, m), bins + 1) for m in distance_metrics}
+    genuine = {m: np.zeros(bins, dtype=np.int64) for m in distance_metrics}
+    impostor = {m: np.zeros(bins, dtype=np.int64) for m in distance_metrics}
+    for start_i in range(0, n, block_size):
+        block_a, labels_a = embeddings[start_i:start_i + block_size], labels[start_i:start_i + block_size]
+        for start_j in range(start_i, n, block_size):
+            block_b, labels_b = embeddings[start_j:start_j + block_size], labels[start_j:start_j + block_size]
+            same = labels_a[:, None] == labels_b[None, :]
+            if start_j == start_i:
+                # Blok diagonal: hanya segitiga atas (tanpa pasangan dengan dirinya sendiri atau duplikat)
+                valid = np.triu(np.ones(same.shape, dtype=bool), k=1)
+                genuine_mask, impostor_mask = same & valid, ~same & valid
+            else:
+                genuine_mask, impostor_mask = same, ~same
+            for distance_metric in distance_metrics:
+                distances = pairwise_distances(block_a, block_b, distance_metric)
+                width = edges[distance_metric][-1] / bins
+                bin_index = np.clip((distances / width).astype(np.int64), 0, bins - 1)
+                genuine[distance_metric] += np.bincount(bin_index[genuine_mask], minlength=bins)
+                impostor[distance_metric] += np.bincount(bin_index[impostor_mask], minlength=bins)
+    return {m: (genuine[m], impostor[m], edges[m]) for m in distance_metrics}
+
+
+def roc_from_histograms(genuine_counts, impostor_counts, edges):
+    """
+    Kurva ROC untuk aturan 'cocok bila jarak <= threshold' di setiap batas atas bin.
+    Mengembalikan dict array: threshold, far (impostor diterima), frr (genuine ditolak), tar.
+    """
+    genuine_total = max(int(genuine_counts.sum()), 1)
+    impostor_total = max(int(impostor_counts.sum()), 1)
+    tar = np.cumsum(genuine_counts) / genuine_total
+    far = np.cumsum(impostor_counts) / impostor_total
+    return {"threshold": edges[1:], "far": far, "frr": 1 - tar, "tar": tar}
+
+
+def _rates_at(roc, threshold):
+    k = min(int(np.searchsorted(roc["threshold"], threshold)), len(roc["threshold"]) - 1)
+    return float(roc["far"][k]), float(roc["frr"][k])
+
+
+def evaluate_metric(genuine_counts, impostor_counts, edges, target_far=None, reference_threshold=None):
+    """
+    Ringkasan satu (model, metrik): EER dan threshold-nya, AUC, serta threshold terpilih. Tanpa 'target_far'
+    threshold terpilih = titik EER; dengan 'target_far' = threshold terbesar yang FAR-nya <= target, atau None
+    (beserta far/frr) bila target lebih kecil dari FAR terendah yang bisa dicapai pada resolusi histogram.
+    'reference_threshold' (threshold bawaan DeepFace) ikut dievaluasi sebagai pembanding.
+    """
+    roc = roc_from_histograms(genuine_counts, impostor_counts, edges)
+    eer_index = int(np.argmin(np.abs(roc["far"] - roc["frr"])))
+    far_curve, tar_curve = np.r_[0.0, roc["far"]], np.r_[0.0, roc["tar"]]
+    auc = float(np.sum(np.diff(far_curve) * (tar_curve[1:] + tar_curve[:-1]) / 2))
+    if target_far is None:
+        chosen_index, criterion = eer_index, "eer"
+    else:
+        # -1: bahkan bin pertama sudah melampaui target FAR, sehingga tidak ada threshold yang memenuhi
+        chosen_index, criterion = int(np.searchsorted(roc["far"], target_far, side="right")) - 1, f"far<={target_far:g}"
+    chosen = chosen_index >= 0
+    report = {
+        "threshold": float(roc["threshold"][chosen_index]) if chosen else None, "criterion": criterion,
+        "far": float(roc["far"][chosen_index]) if chosen else None, "frr": float(roc["frr"][chosen_index]) if chosen else None,
+        "eer": float((roc["far"][eer_index] + roc["frr"][eer_index]) / 2), "eer_threshold": float(roc["threshold"][eer_index]),
+        "auc": auc, "genuine_pairs": int(genuine_counts.sum()), "impostor_pairs": int(impostor_counts.sum()),
+    }
+    if reference_threshold is not None:
+        reference_far, reference_frr = _rates_at(roc, reference_threshold)
+        report.update({"deepface_threshold": float(reference_threshold), "deepface_far": reference_far, "deepface_frr": reference_frr})
+    return report
+
+
+def calibrate(embeddings_by_model, identities, distance_metrics=DISTANCE_METRICS, target_far=None, block_size=2048):
+    """Threshold terkalibrasi untuk setiap model x metrik: {model: {metrik: report evaluate_metric}}."""
+    from deepface.modules.verification import find_threshold
+    thresholds = {}
+    for model_name, embeddings in embeddings_by_model.items():
+        histograms = pair_histograms(embeddings, identities, distance_metrics, block_size=block_size)
+        thresholds[model_name] = {
+            metric: evaluate_metric(*histograms[metric], target_far=target_far,
+                                    reference_threshold=find_threshold(model_name, metric))
+            for metric in distance_metrics
+        }
+    return thresholds
+
+
+def write_thresholds(output_path, thresholds, dataset_info):
+    """
+    Menulis file yang dibaca thresholds.load_thresholds (atomic replace). Kombinasi tanpa threshold (target FAR
+    tidak tercapai) tidak ditulis sehingga verifikasi tetap memakai threshold bawaan DeepFace untuknya.
+    """
+    thresholds = {model_name: {metric: report for metric, report in metrics.items() if report["threshold"] is not None}
+                  for model_name, metrics in thresholds.items()}
+    thresholds = {model_name: metrics for model_name, metrics in thresholds.items() if metrics}
+    payload = {"version": 1, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "dataset": dataset_info, "thresholds": thresholds}
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, output_path)
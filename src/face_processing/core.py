@@ -1,105 +1,598 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from deepface import DeepFace
-import tempfile
-import os
+from deepface.modules import preprocessing, detection
+from deepface.models.FacialRecognition import FacialRecognition
+from deepface.models.demography import Emotion, Gender, Race
 import numpy as np
 from PIL import Image
 import io
 import cv2
+from src.face_processing.model_registry import get_registry, ACTION_MODEL_NAMES, ATTRIBUTE_INPUT_SIZE, TASK_RECOGNITION, TASK_ATTRIBUTE, TASK_DETECTOR
+from src.face_processing.embedding_cache import get_embedding_cache
+from src.face_processing.attribute_cache import get_attribute_cache
+from src.face_processing.utils import content_hash, find_distance, l2_normalize, DISTANCE_METRICS
+from src.face_processing.profiling import StageProfiler
+from src.face_processing.thresholds import resolve_threshold
 
 # Konstanta yang tidak diubah oleh pengguna
 # VERIFY_DISTANCE_METRIC DIHAPUS DARI SINI, AKAN JADI PARAMETER
 ANALYZE_ACTIONS = ['age', 'emotion', 'gender', 'race']
+# Pilihan yang ditampilkan di sidebar app.py (juga dipakai oleh benchmark)
+MODEL_NAMES = ["VGG-Face", "Facenet", "Facenet512", "OpenFace", "DeepFace", "DeepID", "ArcFace", "Dlib", "SFace"]
+DETECTOR_BACKENDS = ['opencv', 'ssd', 'dlib', 'mtcnn', 'retinaface', 'mediapipe']
+# Sisi terpanjang salinan gambar untuk deteksi dan untuk tampilan (piksel)
+DETECTION_MAX_SIDE = 1280
+THUMBNAIL_MAX_SIDE = 800
+# Margin crop di sekitar wajah (relatif terhadap sisi terpanjang kotak) saat alignment dari gambar asli
+ALIGN_CROP_MARGIN = 0.6
+# Faktor scaled decode libjpeg yang didukung OpenCV (DCT scaling, tanpa decode resolusi penuh)
+_REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
 
-def verify_images(img1_bytes, img2_bytes, model_name="VGG-Face", detector_backend="opencv", distance_metric="cosine"): # TAMBAHKAN distance_metric
+def _encoded_long_side(img_bytes):
+    """Sisi terpanjang gambar dari header saja (PIL tidak men-decode piksel); None bila tidak terbaca."""
+    try:
+        return max(Image.open(io.BytesIO(img_bytes)).size)
+    except Exception:
+        return None
+
+def _downscale(img_array, max_side):
+    """Mengecilkan array sampai sisi terpanjang <= max_side (INTER_AREA); array kecil dikembalikan apa adanya."""
+    long_side = max(img_array.shape[:2])
+    if not max_side or long_side <= max_side:
+        return img_array
+    scale = max_side / long_side
+    return cv2.resize(img_array, (max(1, round(img_array.shape[1] * scale)), max(1, round(img_array.shape[0] * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+def decode_image_bytes(img_bytes, max_side=None):
+    """
+    Men-decode bytes gambar (JPEG/PNG) satu kali menjadi array BGR uint8, format yang diharapkan DeepFace.
+    Array ini disimpan oleh pemanggil selama request sehingga tidak ada file sementara maupun decode ulang.
+    Dengan 'max_side', JPEG besar di-decode langsung pada 1/2, 1/4, atau 1/8 resolusi lalu diperkecil
+    sampai sisi terpanjang <= max_side, sehingga foto 12-48 MP tidak pernah ada di memori secara utuh.
+    """
+    flags = cv2.IMREAD_COLOR
+    if max_side:
+        long_side = _encoded_long_side(img_bytes)
+        for factor, reduced_flag in _REDUCED_DECODE_FLAGS:
+            if long_side and long_side / factor >= max_side:
+                flags = reduced_flag
+                break
+    img_array = cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), flags)
+    if img_array is None:
+        raise ValueError("Gambar tidak dapat di-decode (format tidak didukung atau file rusak).")
+    return _downscale(img_array, max_side)
+
+def make_thumbnail(img, max_side=THUMBNAIL_MAX_SIDE):
+    """Salinan kecil (BGR) untuk tampilan; bytes di-decode dengan scaled decode, array diperkecil."""
+    if isinstance(img, np.ndarray):
+        return _downscale(img, max_side)
+    return decode_image_bytes(img, max_side=max_side)
+
+def _as_bgr_array(img):
+    """Menerima bytes atau array BGR; bytes di-decode, array dipakai langsung tanpa salinan."""
+    if isinstance(img, np.ndarray):
+        return img
+    return decode_image_bytes(img)
+
+@dataclass
+class FaceRecord:
+    """
+    Hasil deteksi satu wajah yang dipakai ulang oleh tahap analisis dan verifikasi.
+    'face' adalah crop ter-align dalam RGB float [0, 1] (keluaran DeepFace.extract_faces),
+    'region' adalah facial_area pada gambar asli, 'detector_backend' detektor yang dipakai,
+    'source_hash' hash isi gambar asli (kunci cache embedding).
+    """
+    face: np.ndarray
+    region: dict
+    detector_backend: str
+    confidence: float = 0.0
+    source_hash: str = None
+    _rgb_uint8: np.ndarray = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def rgb_uint8(self):
+        """Crop dalam RGB uint8 untuk tampilan (st.image / PIL), dihitung sekali."""
+        if self._rgb_uint8 is None:
+            self._rgb_uint8 = (self.face * 255).astype(np.uint8)
+        return self._rgb_uint8
+
+    @property
+    def bgr_uint8(self):
+        """Crop dalam BGR uint8, format input numpy yang diharapkan DeepFace."""
+        return np.ascontiguousarray(self.rgb_uint8[:, :, ::-1])
+
+    @property
+    def cache_id(self):
+        """Identitas crop untuk kunci cache: hash gambar asli + region (unik per wajah dalam satu gambar)."""
+        if self.source_hash is None:
+            return content_hash(self.face)
+        region = self.region or {}
+        return f"{self.source_hash}:{region.get('x')},{region.get('y')},{region.get('w')},{region.get('h')}"
+
+    def to_png_bytes(self):
+        """Encode crop ke PNG; hanya untuk unduhan/ekspor, tidak dipakai di jalur analisis."""
+        img_byte_arr = io.BytesIO()
+        Image.fromarray(self.rgb_uint8).save(img_byte_arr, format='PNG')
+        return img_byte_arr.getvalue()
+
+def represent_face(img, model_name="VGG-Face", detector_backend="opencv", align=True, cache=None, profiler=None):
+    """
+    Menghitung embedding satu wajah dengan cache LRU berkunci (content_hash, model, detektor, align).
+    img boleh berupa bytes, array BGR, atau FaceRecord (untuk FaceRecord deteksi dilewati dan
+    detektor/align diambil dari record). Pemanggilan ulang dengan gambar & konfigurasi yang sama
+    hanya membaca cache, sehingga ganti metrik atau perbandingan berulang tidak memicu inferensi.
+    """
+    cache = cache if cache is not None else get_embedding_cache()
+    profiler = profiler or StageProfiler()
+    try:
+        with profiler.stage("embedding_cache_lookup"):
+            if isinstance(img, FaceRecord):
+                detector_backend, align = img.detector_backend, True
+                key = cache.make_key(img.cache_id, model_name, detector_backend, align)
+            else:
+                key = cache.make_key(content_hash(img), model_name, detector_backend, align)
+            embedding = cache.get(key)
+        if embedding is not None:
+            return {"embedding": embedding, "cached": True, "error": None, "timings": profiler.breakdown()}
+        with profiler.stage(f"embedding:{model_name}"), get_registry().use(TASK_RECOGNITION, model_name):
+            if isinstance(img, FaceRecord):
+                # Crop sudah ter-align; sama seperti jalur internal DeepFace.verify
+                embedding_objs = DeepFace.represent(
+                    img_path=img.face, model_name=model_name,
+                    detector_backend="skip", enforce_detection=False, align=False
+                )
+            else:
+                embedding_objs = DeepFace.represent(
+                    img_path=_as_bgr_array(img), model_name=model_name,
+                    detector_backend=detector_backend, enforce_detection=False, align=align
+                )
+        embedding = cache.put(key, embedding_objs[0]['embedding'])
+        return {"embedding": embedding, "cached": False, "error": None, "timings": profiler.breakdown()}
+    except Exception as e:
+        error_msg = f"Embedding gagal (Model: {model_name}, Det: {detector_backend}): {type(e).__name__} - {str(e)}"
+        return {"embedding": None, "cached": False, "error": error_msg, "timings": profiler.breakdown()}
+
+def _prepare_recognition_input(face, model):
+    """Crop RGB float -> tensor (1, h, w, 3) siap model, identik dengan pra-proses DeepFace.represent."""
+    width, height = model.input_shape
+    img = preprocessing.resize_image(img=face[:, :, ::-1], target_size=(height, width))
+    return preprocessing.normalize_input(img=img, normalization="base")
+
+# Model yang meng-override forward hanya untuk normalisasi L2 setelah pemanggilan Keras biasa
+_L2_NORMALIZED_MODELS = ("VGG-Face",)
+
+def _forward_batch(model, batch):
+    """
+    Satu forward pass untuk seluruh batch bila model memakai forward Keras bawaan (atau VGG-Face, yang
+    hanya menambah normalisasi L2 per baris); model dengan forward khusus (SFace, Dlib) dijalankan per item.
+    """
+    if type(model).forward is FacialRecognition.forward:
+        return model.model(batch, training=False).numpy()
+    if getattr(model, "model_name", None) in _L2_NORMALIZED_MODELS:
+        return l2_normalize(model.model(batch, training=False).numpy())
+    return [model.forward(batch[i:i + 1]) for i in range(len(batch))]
+
+def represent_records_batch(records, model_name="VGG-Face", cache=None, profiler=None):
+    """
+    Embedding untuk banyak FaceRecord sekaligus. Record yang sudah ada di cache tidak dihitung ulang;
+    sisanya ditumpuk menjadi satu tensor dan dijalankan dalam satu inferensi model.
+    Mengembalikan list embedding float32 dengan urutan yang sama seperti 'records'.
+    """
+    cache = cache if cache is not None else get_embedding_cache()
+    profiler = profiler or StageProfiler()
+    embeddings, pending = [None] * len(records), []
+    for i, record in enumerate(records):
+        key = cache.make_key(record.cache_id, model_name, record.detector_backend, True)
+        embeddings[i] = cache.get(key)
+        if embeddings[i] is None:
+            pending.append((i, key))
+    if pending:
+        with get_registry().use(TASK_RECOGNITION, model_name, profiler=profiler) as model:
+            with profiler.stage("embedding_preprocess"):
+                batch = np.concatenate([_prepare_recognition_input(records[i].face, model) for i, _ in pending])
+            with profiler.stage(f"embedding:{model_name}"):
+                batch_embeddings = _forward_batch(model, batch)
+        for (i, key), embedding in zip(pending, batch_embeddings):
+            embeddings[i] = cache.put(key, embedding)
+    return embeddings
+
+def verify_images(img1, img2, model_name="VGG-Face", detector_backend="opencv", distance_metric="cosine", profiler=None, thresholds=None):
     """
     Memverifikasi similaritas antara dua gambar wajah menggunakan model, detektor, dan metrik jarak yang dipilih.
+    img1/img2 boleh berupa bytes, array BGR hasil decode_image_bytes, atau FaceRecord.
+    Embedding diambil lewat represent_face (ter-cache); jarak dan threshold dihitung dari vektor tersebut
+    dengan rumus DeepFace, sehingga ganti metrik tidak menghitung ulang embedding. Threshold diambil dari
+    'thresholds' / file FP_AI_THRESHOLDS_FILE hasil kalibrasi bila ada, selain itu threshold bawaan DeepFace.
     """
-    img1_path, img2_path = None, None
-    results = None
+    tic = time.perf_counter()
+    profiler = profiler or StageProfiler()
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp1, \
-             tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp2:
-            tmp1.write(img1_bytes)
-            img1_path = tmp1.name
-            tmp2.write(img2_bytes)
-            img2_path = tmp2.name
-
-        results = DeepFace.verify(
-            img1_path=img1_path, img2_path=img2_path, model_name=model_name,
-            detector_backend=detector_backend, distance_metric=distance_metric, # GUNAKAN PARAMETER
-            enforce_detection=False, align=False, silent=True
-        )
+        facial_areas, embeddings = {}, []
+        for key, img in (('img1', img1), ('img2', img2)):
+            # Input mentah (bukan FaceRecord) tetap memakai align=False seperti DeepFace.verify sebelumnya
+            represent_res = represent_face(img, model_name, detector_backend, align=False, profiler=profiler)
+            if represent_res["error"]:
+                raise ValueError(f"{key}: {represent_res['error']}")
+            embeddings.append(represent_res["embedding"])
+            facial_areas[key] = img.region if isinstance(img, FaceRecord) else None
+        with profiler.stage("distance"):
+            distance = find_distance(embeddings[0], embeddings[1], distance_metric)
+            threshold, threshold_source = resolve_threshold(model_name, distance_metric, thresholds)
+        results = {
+            "verified": distance <= threshold, "distance": distance, "threshold": threshold, "threshold_source": threshold_source,
+            "model": model_name, "detector_backend": detector_backend, "similarity_metric": distance_metric,
+            "facial_areas": facial_areas, "time": round(time.perf_counter() - tic, 4),
+        }
         results['model_name_used'] = model_name
         results['detector_backend_used'] = detector_backend
         results['distance_metric_used'] = distance_metric # Tambahkan metrik yang digunakan ke hasil
+        results['timings'] = profiler.breakdown()
         return results
     except Exception as e:
-        error_msg = f"Verifikasi gagal (Model: {model_name}, Det: {detector_backend}, Metrik: {distance_metric}): {type(e)._name_} - {str(e)}"
-        return {"error": error_msg, "model_name_used": model_name, "detector_backend_used": detector_backend, "distance_metric_used": distance_metric}
-    finally:
-        if img1_path and os.path.exists(img1_path): os.remove(img1_path)
-        if img2_path and os.path.exists(img2_path): os.remove(img2_path)
-
-# --- Fungsi analyze_face_attributes dan extract_aligned_face_bytes tetap SAMA seperti versi terakhir ---
-# --- Saya tidak akan menyalinnya lagi untuk menghemat ruang, pastikan Anda menggunakan versi terakhirnya ---
-def analyze_face_attributes(img_bytes, detector_backend="opencv"):
-    """Menganalisis atribut wajah dari gambar (idealnya sudah di-crop dan align)."""
-    img_path = None
+        error_msg = f"Verifikasi gagal (Model: {model_name}, Det: {detector_backend}, Metrik: {distance_metric}): {type(e).__name__} - {str(e)}"
+        return {"error": error_msg, "model_name_used": model_name, "detector_backend_used": detector_backend, "distance_metric_used": distance_metric,
+                "timings": profiler.breakdown()}
+
+def sweep_models(img1, img2, model_names=MODEL_NAMES, distance_metrics=DISTANCE_METRICS, detector_backend="opencv",
+                 max_workers=4, profiler=None, thresholds=None):
+    """
+    Mode perbandingan: setiap gambar dideteksi sekali, embedding kedua wajah dihitung sekali per model
+    (satu batch berisi dua crop, model-model independen dijalankan paralel di thread pool), lalu semua
+    metrik dihitung dari vektor yang sama. Embedding memakai cache bersama sehingga hasil verify_images
+    sebelumnya dipakai ulang. Mengembalikan satu baris per kombinasi model x metrik; 'load_ms' adalah waktu
+    memuat bobot model (0 bila sudah resident), 'embedding_ms' waktu pra-proses + inferensi saja.
+    """
+    tic = time.perf_counter()
+    profiler = profiler or StageProfiler()
+    try:
+        records = []
+        for key, img in (('img1', img1), ('img2', img2)):
+            if not isinstance(img, FaceRecord):
+                extract_res = extract_face_record(img, detector_backend, profiler=profiler)
+                if extract_res["error"]:
+                    raise ValueError(f"{key}: {extract_res['error']}")
+                img = extract_res["record"]
+            records.append(img)
+
+        def embed(model_name):
+            # Profiler per model: waktu load bobot (tahap model_load) dipisah dari waktu inferensi
+            model_profiler = StageProfiler()
+            model_tic = time.perf_counter()
+            try:
+                embeddings, error = represent_records_batch(records, model_name, profiler=model_profiler), None
+            except Exception as e:
+                embeddings, error = None, f"{type(e).__name__} - {str(e)}"
+            total_s = time.perf_counter() - model_tic
+            load_s = sum(r["time_ms"] for r in model_profiler.breakdown() if r["stage"].startswith("model_load:")) / 1000
+            return embeddings, load_s, total_s - load_s, error
+
+        # Thread paralel dibatasi slot model yang tidak di-pin agar model yang baru dimuat satu thread
+        # tidak dikeluarkan (LRU) oleh load di thread lain sebelum dipakai
+        workers = max(1, min(max_workers, len(model_names)))
+        free_slots = get_registry().unpinned_slots()
+        if free_slots is not None:
+            workers = max(1, min(workers, free_slots))
+        with profiler.stage("sweep_embeddings"), ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(embed, model_names))
+        rows = []
+        with profiler.stage("sweep_distances"):
+            for model_name, (embeddings, load_s, embed_s, error) in zip(model_names, outcomes):
+                for distance_metric in distance_metrics:
+                    row = {"model": model_name, "distance_metric": distance_metric, "load_ms": round(load_s * 1000, 1),
+                           "embedding_ms": round(embed_s * 1000, 1), "error": error}
+                    if error is None:
+                        distance = find_distance(embeddings[0], embeddings[1], distance_metric)
+                        threshold, threshold_source = resolve_threshold(model_name, distance_metric, thresholds)
+                        row.update({"distance": distance, "threshold": threshold, "threshold_source": threshold_source,
+                                    "verified": distance <= threshold})
+                    rows.append(row)
+        return {"results": rows, "facial_areas": {"img1": records[0].region, "img2": records[1].region}, "error": None,
+                "time": round(time.perf_counter() - tic, 4), "timings": profiler.breakdown()}
+    except Exception as e:
+        error_msg = f"Perbandingan model gagal (Det: {detector_backend}): {type(e).__name__} - {str(e)}"
+        return {"results": [], "facial_areas": {}, "error": error_msg, "time": round(time.perf_counter() - tic, 4),
+                "timings": profiler.breakdown()}
+
+def _prepare_attribute_input(face):
+    """Crop RGB float -> tensor (1, 224, 224, 3) BGR, identik dengan pra-proses DeepFace.analyze."""
+    return preprocessing.resize_image(img=face[:, :, ::-1], target_size=ATTRIBUTE_INPUT_SIZE)
+
+def _predict_attribute_batch(action, model, batch):
+    """Satu forward pass model atribut untuk seluruh batch; mengembalikan array (n, kelas)."""
+    if action == 'emotion':
+        # Model emosi memakai input grayscale 48x48 (lihat EmotionClient.predict)
+        batch = np.stack([cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (48, 48)) for img in batch])[..., np.newaxis]
+    return model.model(batch, training=False).numpy()
+
+def _format_attribute(action, predictions):
+    """Prediksi mentah satu wajah -> field hasil dengan format yang sama seperti DeepFace.analyze."""
+    if action == 'age':
+        return {'age': int(np.sum(predictions * np.arange(0, 101)))}
+    if action == 'gender':
+        return {'gender': {label: float(100 * p) for label, p in zip(Gender.labels, predictions)},
+                'dominant_gender': Gender.labels[int(np.argmax(predictions))]}
+    labels = Emotion.labels if action == 'emotion' else Race.labels
+    total = predictions.sum()
+    return {action: {label: float(100 * p / total) for label, p in zip(labels, predictions)},
+            f'dominant_{action}': labels[int(np.argmax(predictions))]}
+
+def _validate_actions(actions):
+    unknown = [action for action in actions if action not in ANALYZE_ACTIONS]
+    if unknown:
+        raise ValueError(f"Aksi atribut tidak dikenal: {unknown}. Pilihan: {ANALYZE_ACTIONS}")
+    return list(dict.fromkeys(actions))
+
+def analyze_records_batch(records, actions=ANALYZE_ACTIONS, profiler=None, cache=None):
+    """
+    Atribut untuk banyak FaceRecord sekaligus tanpa deteksi ulang: crop ditumpuk menjadi satu tensor
+    dan setiap model atribut dijalankan sekali untuk seluruh batch. Mengembalikan satu dict per record.
+    Hanya model untuk 'actions' yang dimuat; hasil disimpan per (wajah, aksi) di cache sehingga aksi
+    yang sudah pernah dihitung tidak dijalankan ulang.
+    """
+    actions = _validate_actions(actions)
+    if not records:
+        return []
+    cache = cache if cache is not None else get_attribute_cache()
+    profiler = profiler or StageProfiler()
+    results = [{'region': record.region, 'face_confidence': record.confidence,
+                'detector_backend_used_for_attributes': record.detector_backend} for record in records]
+    inputs = {}  # pra-proses hanya untuk record yang benar-benar butuh inferensi, dan hanya sekali
+    registry = get_registry()
+    for action in actions:
+        missing = []
+        for i, record in enumerate(records):
+            fields = cache.get(record.cache_id, action)
+            if fields is None:
+                missing.append(i)
+            else:
+                results[i].update(fields)
+        if not missing:
+            continue
+        with profiler.stage("attribute_preprocess"):
+            for i in missing:
+                if i not in inputs:
+                    inputs[i] = _prepare_attribute_input(records[i].face)
+            batch = np.concatenate([inputs[i] for i in missing])
+        with profiler.stage(f"attribute:{action}"), registry.use(TASK_ATTRIBUTE, ACTION_MODEL_NAMES[action]) as model:
+            predictions = _predict_attribute_batch(action, model, batch)
+        for i, row in zip(missing, predictions):
+            results[i].update(cache.put(records[i].cache_id, action, _format_attribute(action, row)))
+    return results
+
+def analyze_face_attributes(img, detector_backend="opencv", actions=ANALYZE_ACTIONS, profiler=None):
+    """
+    Menganalisis atribut wajah dari gambar (idealnya sudah di-crop dan align): bytes, array BGR, FaceRecord,
+    atau list FaceRecord (semua wajah satu gambar dari extract_face_records, diproses sebagai satu batch).
+    Untuk FaceRecord detektor tidak dijalankan lagi dan region diambil dari record (lihat analyze_records_batch).
+    Hanya aksi di 'actions' (subset ANALYZE_ACTIONS) yang dihitung dan modelnya dimuat.
+    """
+    profiler = profiler or StageProfiler()
+    if isinstance(img, FaceRecord):
+        img = [img]
+    if isinstance(img, list) and img:
+        detector_backend = img[0].detector_backend
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            tmp.write(img_bytes)
-            img_path = tmp.name
-
-        detected_faces_data = DeepFace.analyze(
-            img_path=img_path, actions=ANALYZE_ACTIONS, detector_backend=detector_backend,
-            enforce_detection=False, align=False, silent=True
-        )
+        actions = _validate_actions(actions)
+        if isinstance(img, list):
+            return {"data": analyze_records_batch(img, actions, profiler=profiler), "error": None, "timings": profiler.breakdown()}
+        if not actions:
+            return {"data": [], "error": "Tidak ada aksi atribut yang dipilih.", "timings": profiler.breakdown()}
+        registry = get_registry()
+        for action in actions:
+            registry.get(TASK_ATTRIBUTE, ACTION_MODEL_NAMES[action])
+        with profiler.stage("decode"):
+            img_array = _as_bgr_array(img)
+        with profiler.stage("detect_and_attributes"):
+            detected_faces_data = DeepFace.analyze(
+                img_path=img_array, actions=actions, detector_backend=detector_backend,
+                enforce_detection=False, align=False, silent=True
+            )
         if not detected_faces_data:
-            return {"data": [], "error": "Analisis atribut tidak menghasilkan data (wajah tidak valid?)."}
+            return {"data": [], "error": "Analisis atribut tidak menghasilkan data (wajah tidak valid?).", "timings": profiler.breakdown()}
         for face_info in detected_faces_data:
             face_info['detector_backend_used_for_attributes'] = detector_backend
-        return {"data": detected_faces_data, "error": None}
+        return {"data": detected_faces_data, "error": None, "timings": profiler.breakdown()}
     except Exception as e:
-        error_msg = f"Analisis atribut gagal (Detektor: {detector_backend}): {type(e)._name_} - {str(e)}"
-        return {"data": [], "error": error_msg}
-    finally:
-        if img_path and os.path.exists(img_path): os.remove(img_path)
-
-def extract_aligned_face_bytes(img_bytes_original, detector_backend="opencv"):
-    """Mendeteksi, meng-crop, dan meng-align wajah dari gambar asli."""
-    img_path_original = None
+        error_msg = f"Analisis atribut gagal (Detektor: {detector_backend}): {type(e).__name__} - {str(e)}"
+        return {"data": [], "error": error_msg, "timings": profiler.breakdown()}
+
+def _offset_region(region, scale=1.0, dx=0, dy=0):
+    """Memetakan facial_area (termasuk titik mata) dari salinan berskala/crop ke koordinat gambar asli."""
+    mapped = dict(region)
+    for key, offset in (('x', dx), ('y', dy)):
+        mapped[key] = int(round(region[key] * scale)) + offset
+    for key in ('w', 'h'):
+        mapped[key] = int(round(region[key] * scale))
+    for key in ('left_eye', 'right_eye'):
+        if region.get(key) is not None:
+            mapped[key] = (int(round(region[key][0] * scale)) + dx, int(round(region[key][1] * scale)) + dy)
+    return mapped
+
+def _align_from_original(img_full, region, detector_backend, confidence=0.0):
+    """
+    Crop wilayah wajah (plus margin) dari gambar resolusi penuh lalu align crop itu memakai titik mata hasil
+    deteksi di salinan kecil, tanpa memanggil detektor lagi; rotasi alignment tidak pernah menyentuh gambar utuh.
+    Detektor hanya dijalankan ulang pada crop bila titik mata tidak tersedia; bila di crop pun tidak ditemukan
+    wajah, dipakai crop tanpa align. Mengembalikan data wajah DeepFace dengan region di koordinat gambar asli.
+    """
+    height, width = img_full.shape[:2]
+    pad = int(max(region['w'], region['h']) * ALIGN_CROP_MARGIN)
+    x0, y0 = max(0, region['x'] - pad), max(0, region['y'] - pad)
+    x1, y1 = min(width, region['x'] + region['w'] + pad), min(height, region['y'] + region['h'] + pad)
+    crop = img_full[y0:y1, x0:x1]
+    if region.get('left_eye') is not None and region.get('right_eye') is not None:
+        # Sama dengan alignment di DeepFace.extract_faces: rotasi menurut sudut mata, lalu kotak wajah diproyeksikan
+        aligned_crop, angle = detection.align_img_wrt_eyes(img=crop, left_eye=region['left_eye'], right_eye=region['right_eye'])
+        rel_x, rel_y = region['x'] - x0, region['y'] - y0
+        ax1, ay1, ax2, ay2 = detection.project_facial_area(
+            facial_area=(rel_x, rel_y, rel_x + region['w'], rel_y + region['h']), angle=angle, size=crop.shape[:2])
+        face = aligned_crop[int(ay1):int(ay2), int(ax1):int(ax2)]
+        if face.size:
+            return {'face': face[:, :, ::-1] / 255.0, 'facial_area': region, 'confidence': confidence}
+    try:
+        # enforce_detection=True: tanpa wajah DeepFace melempar ValueError alih-alih mengembalikan seluruh crop
+        candidates = DeepFace.extract_faces(img_path=crop, detector_backend=detector_backend, enforce_detection=True, align=True)
+    except ValueError:
+        candidates = []
+    if candidates:
+        center = (region['x'] + region['w'] / 2 - x0, region['y'] + region['h'] / 2 - y0)
+        best = min(candidates, key=lambda c: (c['facial_area']['x'] + c['facial_area']['w'] / 2 - center[0]) ** 2
+                                             + (c['facial_area']['y'] + c['facial_area']['h'] / 2 - center[1]) ** 2)
+        return {'face': best['face'], 'facial_area': _offset_region(best['facial_area'], dx=x0, dy=y0),
+                'confidence': best.get('confidence', 0.0)}
+    face = img_full[region['y']:region['y'] + region['h'], region['x']:region['x'] + region['w']]
+    return {'face': face[:, :, ::-1] / 255.0, 'facial_area': region, 'confidence': confidence}
+
+def _detection_input(img_original, max_side, detection_image=None):
+    """
+    Salinan untuk deteksi (sisi terpanjang <= max_side) dan gambar penuh bila sudah tersedia.
+    Untuk bytes JPEG besar hanya salinan kecil yang di-decode; gambar penuh (None) baru di-decode
+    bila memang ada wajah yang perlu di-crop. 'detection_image' adalah hasil decode_image_bytes(img_original,
+    max_side) milik pemanggil (mis. sumber thumbnail) sehingga bytes tidak di-decode dua kali.
+    """
+    if isinstance(img_original, np.ndarray):
+        return _downscale(img_original, max_side), img_original
+    if detection_image is not None:
+        # Salinan sama dengan gambar penuh bila sisi terpanjang di header tidak lebih besar dari salinannya
+        long_side = _encoded_long_side(img_original)
+        is_full = long_side is not None and long_side <= max(detection_image.shape[:2])
+        return detection_image, detection_image if is_full else None
+    long_side = _encoded_long_side(img_original)
+    if not max_side or long_side is None or long_side <= max_side:
+        img_full = decode_image_bytes(img_original)
+        return _downscale(img_full, max_side), img_full
+    return decode_image_bytes(img_original, max_side=max_side), None
+
+def extract_face_records(img_original, detector_backend="opencv", source_hash=None, profiler=None, max_detection_side=DETECTION_MAX_SIDE,
+                         detection_image=None, align_on_original=True):
+    """
+    Mendeteksi, meng-crop, dan meng-align SEMUA wajah dari gambar asli (bytes atau array BGR) dalam satu
+    pemanggilan detektor. Mengembalikan list FaceRecord (urutan keluaran detektor) yang bisa diteruskan
+    sekaligus ke analyze_face_attributes / represent_records_batch agar inferensi berjalan sebagai satu batch.
+    'source_hash' sebaiknya hash bytes unggahan (content_hash); bila kosong dihitung dari input.
+    Gambar yang lebih besar dari 'max_detection_side' dideteksi pada salinan kecil (scaled decode); region
+    dipetakan kembali ke resolusi penuh dan alignment dilakukan pada crop wajah dari gambar asli.
+    Pemanggil yang sudah men-decode salinan deteksi (decode_image_bytes(bytes, max_detection_side), mis. untuk
+    thumbnail) meneruskannya lewat 'detection_image' agar tidak di-decode ulang. Dengan align_on_original=False
+    crop dan alignment diambil langsung dari salinan deteksi (satu pemanggilan detektor per gambar, crop beresolusi
+    lebih rendah), misalnya untuk frame video.
+    """
+    profiler = profiler or StageProfiler()
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp_orig:
-            tmp_orig.write(img_bytes_original)
-            img_path_original = tmp_orig.name
-
-        extracted_face_data_list = DeepFace.extract_faces(
-            img_path=img_path_original, detector_backend=detector_backend,
-            enforce_detection=True, align=True
-        )
-
-        if extracted_face_data_list and len(extracted_face_data_list) > 0:
-            face_numpy_float = extracted_face_data_list[0]['face']
-            face_numpy_uint8 = (face_numpy_float * 255).astype(np.uint8)
-            # Jika versi core.py sebelumnya yang memperbaiki warna sudah benar, gunakan itu.
-            # Jika extract_faces mengembalikan BGR, maka konversi ke RGB diperlukan:
-            # face_numpy_rgb_uint8 = cv2.cvtColor(face_numpy_uint8, cv2.COLOR_BGR2RGB)
-            # pil_image_cropped = Image.fromarray(face_numpy_rgb_uint8)
-            # Jika extract_faces sudah RGB (seperti yang kita simpulkan terakhir):
-            pil_image_cropped = Image.fromarray(face_numpy_uint8)
-
-
-            img_byte_arr = io.BytesIO()
-            pil_image_cropped.save(img_byte_arr, format='PNG') # PNG untuk debug, bisa JPEG
-            img_byte_arr = img_byte_arr.getvalue()
-            
-            original_region = extracted_face_data_list[0].get('facial_area')
-            return {"face_bytes": img_byte_arr, "original_region": original_region, "error": None}
+        if source_hash is None:
+            with profiler.stage("hash"):
+                source_hash = content_hash(img_original)
+        with profiler.stage("decode_scaled"):
+            img_detect, img_full = _detection_input(img_original, max_detection_side, detection_image)
+        downscaled = img_detect is not img_full
+        align_on_detection = not downscaled or not align_on_original
+        stage_name = "detect_align" if align_on_detection else "detect"
+        with profiler.stage(f"{stage_name}:{detector_backend}"), get_registry().use(TASK_DETECTOR, detector_backend):
+            # Gambar kecil (atau align_on_original=False): deteksi + alignment sekaligus; gambar besar: hanya deteksi di salinan kecil
+            extracted_face_data_list = DeepFace.extract_faces(
+                img_path=img_detect, detector_backend=detector_backend,
+                enforce_detection=True, align=align_on_detection
+            )
+        image_size = None
+        if downscaled and extracted_face_data_list and not align_on_original:
+            # Crop sudah ter-align dari salinan kecil; hanya region yang dipetakan ke koordinat gambar penuh
+            full_long_side = max(img_full.shape[:2]) if img_full is not None else _encoded_long_side(img_original)
+            scale = (full_long_side or max(img_detect.shape[:2])) / max(img_detect.shape[:2])
+            extracted_face_data_list = [dict(face_data, facial_area=_offset_region(face_data['facial_area'], scale))
+                                        for face_data in extracted_face_data_list]
+            image_size = {"w": int(round(img_detect.shape[1] * scale)), "h": int(round(img_detect.shape[0] * scale))}
+        elif downscaled and extracted_face_data_list:
+            if img_full is None:
+                with profiler.stage("decode_full"):
+                    img_full = decode_image_bytes(img_original)
+            # Skala dari bentuk hasil decode (bukan header) agar orientasi EXIF ikut diperhitungkan
+            scale = img_full.shape[1] / img_detect.shape[1]
+            # Detektor hanya dipakai lagi untuk wajah tanpa titik mata (lihat _align_from_original)
+            with profiler.stage(f"crop_align:{detector_backend}"), get_registry().use(TASK_DETECTOR, detector_backend):
+                extracted_face_data_list = [
+                    _align_from_original(img_full, _offset_region(face_data['facial_area'], scale), detector_backend,
+                                         face_data.get('confidence', 0.0))
+                    for face_data in extracted_face_data_list
+                ]
+        # Ukuran gambar penuh (koordinat region); None bila tidak ada wajah dan gambar penuh tak pernah di-decode
+        if img_full is not None:
+            image_size = {"w": img_full.shape[1], "h": img_full.shape[0]}
+        records = [FaceRecord(face=face_data['face'], region=face_data.get('facial_area'),
+                              detector_backend=detector_backend, confidence=face_data.get('confidence', 0.0),
+                              source_hash=source_hash)
+                   for face_data in extracted_face_data_list or []]
+        if records:
+            return {"records": records, "image_size": image_size, "error": None, "timings": profiler.breakdown()}
         else:
-            return {"face_bytes": None, "original_region": None, "error": "Tidak ada wajah yang dapat di-extract."}
+            return {"records": [], "image_size": image_size, "error": "Tidak ada wajah yang dapat di-extract.", "timings": profiler.breakdown()}
+    except Exception as e:
+        error_msg = f"Proses extract wajah gagal (Detektor: {detector_backend}): {type(e).__name__} - {str(e)}"
+        return {"records": [], "image_size": None, "error": error_msg, "timings": profiler.breakdown()}
+
+def extract_face_record(img_original, detector_backend="opencv", source_hash=None, profiler=None, max_detection_side=DETECTION_MAX_SIDE):
+    """
+    Seperti extract_face_records tetapi hanya mengembalikan wajah pertama sebagai 'record'
+    (untuk pemanggil yang memang memproses satu wajah per gambar: batch, server, galeri).
+    """
+    extract_res = extract_face_records(img_original, detector_backend, source_hash=source_hash, profiler=profiler,
+                                       max_detection_side=max_detection_side)
+    record = extract_res["records"][0] if extract_res["records"] else None
+    return {"record": record, "error": extract_res["error"], "timings": extract_res["timings"]}
+
+def extract_aligned_face_bytes(img_original, detector_backend="opencv", profiler=None):
+    """
+    Mendeteksi, meng-crop, dan meng-align wajah dari gambar asli (bytes atau array BGR).
+    Dipertahankan untuk pemanggil lama yang butuh PNG; jalur baru sebaiknya memakai extract_face_records.
+    Field lama berisi wajah pertama; 'face_records' berisi semua wajah yang terdeteksi.
+    """
+    profiler = profiler or StageProfiler()
+    extract_res = extract_face_records(img_original, detector_backend, profiler=profiler)
+    records = extract_res["records"]
+    if not records:
+        return {"face_bytes": None, "face_array": None, "face_record": None, "face_records": [], "original_region": None,
+                "error": extract_res["error"], "timings": profiler.breakdown()}
+    record = records[0]
+    with profiler.stage("encode_png"):
+        face_bytes = record.to_png_bytes()
+    return {"face_bytes": face_bytes, "face_array": record.bgr_uint8, "face_record": record, "face_records": records,
+            "original_region": record.region, "error": None, "timings": profiler.breakdown()}
+
+def enroll_face(gallery, identity, img, model_name="VGG-Face", detector_backend="opencv", source=None):
+    """Mendaftarkan satu wajah (bytes, array BGR, atau FaceRecord) ke galeri untuk model yang dipilih."""
+    if not isinstance(img, FaceRecord):
+        extract_res = extract_face_record(img, detector_backend)
+        if extract_res["error"]:
+            return {"index": None, "error": extract_res["error"]}
+        img = extract_res["record"]
+    represent_res = represent_face(img, model_name)
+    if represent_res["error"]:
+        return {"index": None, "error": represent_res["error"]}
+    index = gallery.enroll(identity, represent_res["embedding"], model_name, source=source)
+    return {"index": index, "error": None}
+
+def identify_face(gallery, img, model_name="VGG-Face", detector_backend="opencv", distance_metric="cosine", top_k=5):
+    """
+    Identifikasi 1:N: embedding probe dibandingkan ke seluruh galeri model dalam satu operasi matriks.
+    Mengembalikan top-k kandidat beserta jarak, threshold DeepFace, dan status 'verified' tiap kandidat.
+    """
+    try:
+        if not isinstance(img, FaceRecord):
+            extract_res = extract_face_record(img, detector_backend)
+            if extract_res["error"]:
+                return {"matches": [], "error": extract_res["error"]}
+            img = extract_res["record"]
+        represent_res = represent_face(img, model_name)
+        if represent_res["error"]:
+            return {"matches": [], "error": represent_res["error"]}
+        threshold, _ = resolve_threshold(model_name, distance_metric)
+        matches = gallery.search(represent_res["embedding"], model_name, distance_metric, top_k)
+        for match in matches:
+            match["threshold"] = threshold
+            match["verified"] = match["distance"] <= threshold
+        return {"matches": matches, "probe_region": img.region, "gallery_size": gallery.size(model_name), "error": None}
     except Exception as e:
-        error_msg = f"Proses extract wajah gagal (Detektor: {detector_backend}): {type(e)._name_} - {str(e)}"
-        return {"face_bytes": None, "original_region": None, "error": error_msg}
-    finally:
-        if img_path_original and os.path.exists(img_path_original):
-            os.remove(img_path_original)
\ No newline at end of file
+        error_msg = f"Identifikasi gagal (Model: {model_name}, Metrik: {distance_metric}): {type(e).__name__} - {str(e)}"
+        return {"matches": [], "error": error_msg}
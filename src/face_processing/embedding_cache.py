@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Cache LRU embedding wajah di memori dengan kunci (content_hash, model, detektor, align).
+    Jika 'persist_dir' diisi, setiap embedding juga disimpan sebagai file .npy sehingga tetap
+    tersedia setelah proses di-restart (dibaca ulang saat terjadi miss di memori).
+    """
+
+    def __init__(self, max_entries=2048, persist_dir=None):
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(img_hash, model_name, detector_backend, align=True):
+        return (img_hash, model_name, detector_backend, bool(align))
+
+    def get(self, key):
+        """Embedding float32 untuk kunci, atau None bila belum pernah dihitung."""
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return embedding
+        embedding = self._load(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, embedding)
+            return embedding
+
+    def put(self, key, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        with self._lock:
+            self._store(key, embedding)
+        self._save(key, embedding)
+        return embedding
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "persist_dir": self.persist_dir}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key, embedding):
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.persist_dir, f"{name}.npy")
+
+    def _load(self, key):
+        if not self.persist_dir:
+            return None
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            embedding = np.load(path)
+        except (OSError, ValueError):
+            return None
+        embedding.setflags(write=False)
+        return embedding
+
+    def _save(self, key, embedding):
+        if not self.persist_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, embedding)
+        os.replace(tmp_path, path)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Cache bersama untuk seluruh proses; direktori persisten opsional lewat env FP_AI_EMBEDDING_CACHE_DIR."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(persist_dir=os.environ.get("FP_AI_EMBEDDING_CACHE_DIR") or None)
+        return _default_cache
@@ -0,0 +1,187 @@
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+from src.face_processing.utils import DISTANCE_METRICS
+
+# Kapasitas awal matriks (baris); file diperbesar dua kali lipat saat penuh
+INITIAL_CAPACITY = 1024
+
+
+class EmbeddingStore:
+    """
+    Matriks embedding float32 kontigu untuk satu model, di-memory-map dari '<dir>/embeddings.f32'.
+    Label (identity, source) disimpan di 'labels.jsonl' dan jumlah baris valid di 'meta.json'.
+    Norma tiap baris disimpan di memori agar ketiga metrik bisa dihitung dari satu perkalian matriks.
+    """
+
+    def __init__(self, store_dir, dim=None):
+        self.store_dir = store_dir
+        self._lock = threading.RLock()
+        self._matrix_path = os.path.join(store_dir, "embeddings.f32")
+        self._labels_path = os.path.join(store_dir, "labels.jsonl")
+        self._meta_path = os.path.join(store_dir, "meta.json")
+        os.makedirs(store_dir, exist_ok=True)
+        meta = self._read_meta()
+        self.dim = meta.get("dim", dim)
+        self.capacity = meta.get("capacity", 0)
+        self.labels = self._read_labels()
+        # Baris yang sudah ditulis tetapi labelnya belum tercatat (crash di tengah enroll) diabaikan
+        self.count = min(meta.get("count", 0), len(self.labels))
+        if len(self.labels) > self.count:
+            self.labels = self.labels[:self.count]
+            self._rewrite_labels()
+        self._matrix = None
+        self._norms = None
+        if self.capacity and self.dim:
+            self._open_matrix()
+
+    @property
+    def matrix(self):
+        """View (count, dim) dari matriks yang di-memory-map; kosong bila belum ada enrollment."""
+        if self._matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:self.count]
+
+    def add(self, identities, embeddings, sources=None):
+        """Menambahkan banyak embedding sekaligus; mengembalikan indeks baris yang baru."""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        sources = sources or [None] * len(identities)
+        if len(identities) != len(embeddings) or len(sources) != len(embeddings):
+            raise ValueError("Jumlah identitas, embedding, dan source harus sama.")
+        with self._lock:
+            if self.dim is None:
+                self.dim = embeddings.shape[1]
+            if embeddings.shape[1] != self.dim:
+                raise ValueError(f"Dimensi embedding {embeddings.shape[1]} tidak sesuai galeri ({self.dim}).")
+            start = self.count
+            previous_norms = self._row_norms()
+            self._ensure_capacity(start + len(embeddings))
+            self._matrix[start:start + len(embeddings)] = embeddings
+            self._matrix.flush()
+            with open(self._labels_path, "a", encoding="utf-8") as f:
+                for identity, source in zip(identities, sources):
+                    f.write(json.dumps({"identity": identity, "source": source}) + "\n")
+                    self.labels.append({"identity": identity, "source": source})
+            self.count += len(embeddings)
+            self._norms = np.concatenate([previous_norms, np.linalg.norm(embeddings, axis=1)])
+            self._write_meta()
+            return list(range(start, self.count))
+
+    def distances(self, query, distance_metric="cosine"):
+        """Jarak query (dim,) ke seluruh galeri dalam satu operasi matriks; array (count,)."""
+        if distance_metric not in DISTANCE_METRICS:
+            raise ValueError(f"Metrik jarak tidak dikenal: {distance_metric}")
+        query = np.asarray(query, dtype=np.float32).ravel()
+        # Perkalian di dalam lock: tidak ada view memmap yang tersisa saat _ensure_capacity memperbesar file
+        with self._lock:
+            if self.count == 0:
+                return np.zeros(0, dtype=np.float32)
+            dots, norms = self.matrix @ query, self._row_norms()
+        query_norm = np.linalg.norm(query)
+        if distance_metric == "euclidean":
+            return np.sqrt(np.maximum(norms ** 2 - 2 * dots + query_norm ** 2, 0))
+        cosine_similarity = dots / np.maximum(norms * query_norm, np.finfo(np.float32).tiny)
+        if distance_metric == "cosine":
+            return 1 - cosine_similarity
+        return np.sqrt(np.maximum(2 - 2 * cosine_similarity, 0))  # euclidean_l2
+
+    def search(self, query, distance_metric="cosine", top_k=5):
+        """Top-k tetangga terdekat: list dict {index, identity, source, distance}, terurut naik."""
+        distances = self.distances(query, distance_metric)
+        if len(distances) == 0:
+            return []
+        top_k = min(top_k, len(distances))
+        candidates = np.argpartition(distances, top_k - 1)[:top_k]
+        ordered = candidates[np.argsort(distances[candidates])]
+        return [{"index": int(i), "identity": self.labels[i]["identity"], "source": self.labels[i]["source"],
+                 "distance": float(distances[i])} for i in ordered]
+
+    def identities(self):
+        return sorted({label["identity"] for label in self.labels})
+
+    def _row_norms(self):
+        if self._norms is None or len(self._norms) != self.count:
+            self._norms = np.linalg.norm(self.matrix, axis=1) if self.count else np.zeros(0, dtype=np.float32)
+        return self._norms
+
+    def _ensure_capacity(self, required):
+        if required <= self.capacity and self._matrix is not None:
+            return
+        new_capacity = max(INITIAL_CAPACITY, self.capacity)
+        while new_capacity < required:
+            new_capacity *= 2
+        self._close_matrix()
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.capacity = new_capacity
+        self._open_matrix()
+
+    def _close_matrix(self):
+        """
+        Flush lalu unmap memmap sebelum file diubah ukurannya: mengubah ukuran file yang masih di-map gagal
+        di Windows dan tidak terdefinisi di platform lain.
+        """
+        if self._matrix is None:
+            return
+        self._matrix.flush()
+        mapping = getattr(self._matrix, "_mmap", None)
+        # Referensi terakhir ke ndarray dilepas lebih dulu agar buffer mmap tidak lagi diekspor saat ditutup
+        self._matrix = None
+        if mapping is not None:
+            mapping.close()
+
+    def _open_matrix(self):
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _read_meta(self):
+        if not os.path.isfile(self._meta_path):
+            return {}
+        with open(self._meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "capacity": self.capacity}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _rewrite_labels(self):
+        tmp_path = f"{self._labels_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(label) + "\n" for label in self.labels)
+        os.replace(tmp_path, self._labels_path)
+
+    def _read_labels(self):
+        if not os.path.isfile(self._labels_path):
+            return []
+        with open(self._labels_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class FaceGallery:
+    """Galeri identitas terdaftar; satu EmbeddingStore per model di bawah 'root_dir/<model>'."""
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def store(self, model_name):
+        with self._lock:
+            if model_name not in self._stores:
+                safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+                self._stores[model_name] = EmbeddingStore(os.path.join(self.root_dir, safe_name))
+            return self._stores[model_name]
+
+    def enroll(self, identity, embedding, model_name, source=None):
+        return self.store(model_name).add([identity], [embedding], [source])[0]
+
+    def search(self, embedding, model_name, distance_metric="cosine", top_k=5):
+        return self.store(model_name).search(embedding, distance_metric, top_k)
+
+    def size(self, model_name):
+        return self.store(model_name).count
@@ -0,0 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class QueueFullError(RuntimeError):
+    """Antrian scheduler penuh; pemanggil sebaiknya membalas 503 dan mencoba lagi nanti."""
+
+
+class MicroBatcher:
+    """
+    Scheduler micro-batching: request yang datang bersamaan dikumpulkan selama paling lama
+    'max_wait_ms' (atau sampai 'max_batch_size'), dikelompokkan per kunci (mis. nama model),
+    lalu 'process_fn(key, payloads)' dipanggil sekali per kelompok dan harus mengembalikan list
+    hasil dengan urutan yang sama. Bila satu batch gagal, itemnya diproses ulang satu per satu agar
+    satu input rusak tidak ikut menggagalkan request lain di jendela batch yang sama. Inferensi berjalan di 'num_workers' thread (pool terbatas);
+    antrian dibatasi 'max_queue' sehingga kelebihan beban ditolak (backpressure) alih-alih
+    membuat latensi semua pemanggil ikut membengkak.
+    """
+
+    def __init__(self, process_fn, name="batcher", max_batch_size=16, max_wait_ms=5.0, max_queue=256, num_workers=1):
+        self.process_fn = process_fn
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._stats = {"submitted": 0, "rejected": 0, "batches": 0, "items": 0, "batch_retries": 0}
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"{name}-{i}", daemon=True) for i in range(num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key, payload):
+        """Memasukkan satu item ke antrian; mengembalikan Future. QueueFullError bila antrian penuh."""
+        future = Future()
+        try:
+            self._queue.put_nowait((key, payload, future, time.perf_counter()))
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError(f"Antrian {self.name} penuh ({self._queue.maxsize} item).")
+        with self._stats_lock:
+            self._stats["submitted"] += 1
+        return future
+
+    def run(self, key, payload, timeout=None):
+        """submit() lalu menunggu hasilnya; saat timeout item dibatalkan agar tidak ikut diproses."""
+        future = self.submit(key, payload)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect_batch()
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[0], []).append(item)
+            for key, items in groups.items():
+                # Item yang pemanggilnya sudah menyerah (timeout/cancel) tidak perlu diproses
+                items = [item for item in items if item[2].set_running_or_notify_cancel()]
+                if not items:
+                    continue
+                try:
+                    results = self.process_fn(key, [payload for _, payload, _, _ in items])
+                    for (_, _, future, _), result in zip(items, results):
+                        future.set_result(result)
+                except Exception:
+                    self._process_individually(key, items)
+                with self._stats_lock:
+                    self._stats["batches"] += 1
+                    self._stats["items"] += len(items)
+
+    def _process_individually(self, key, items):
+        """Batch gagal: setiap item diulang sendiri sehingga hanya request bermasalah yang menerima exception."""
+        with self._stats_lock:
+            self._stats["batch_retries"] += 1
+        for _, payload, future, _ in items:
+            try:
+                future.set_result(self.process_fn(key, [payload])[0])
+            except Exception as e:
+                future.set_exception(e)
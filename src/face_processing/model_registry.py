@@ -0,0 +1,221 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from deepface import DeepFace
+from deepface.modules import modeling
+
+# Nama task sesuai DeepFace.build_model
+TASK_RECOGNITION = "facial_recognition"
+TASK_ATTRIBUTE = "facial_attribute"
+TASK_DETECTOR = "face_detector"
+
+# Pemetaan action DeepFace.analyze -> nama model atribut
+ACTION_MODEL_NAMES = {'age': 'Age', 'emotion': 'Emotion', 'gender': 'Gender', 'race': 'Race'}
+
+# Ukuran input model atribut (semua berbasis VGG-Face)
+ATTRIBUTE_INPUT_SIZE = (224, 224)
+
+
+def _estimate_model_bytes(model):
+    """Perkiraan memori bobot model (float32); 0 jika bukan model Keras (mis. detektor OpenCV)."""
+    keras_model = getattr(model, "model", None)
+    if keras_model is not None and hasattr(keras_model, "count_params"):
+        return int(keras_model.count_params()) * 4
+    return 0
+
+
+class ModelRegistry:
+    """
+    Registry model tingkat proses di atas cache internal DeepFace (modeling.cached_models).
+    Mencatat waktu load, warmup, jumlah pemakaian dan latensi, serta mengeluarkan model yang
+    jarang dipakai (LRU) bila jumlah model atau perkiraan memori melebihi batas. Model yang
+    di-preload ditandai 'pinned' dan tidak ikut dikeluarkan.
+    """
+
+    def __init__(self, max_resident_models=8, memory_budget_mb=None):
+        self.max_resident_models = max_resident_models
+        self.memory_budget_mb = memory_budget_mb
+        self._entries = OrderedDict()  # (task, model_name) -> stats, urutan = LRU
+        self._lock = threading.RLock()
+        self._load_locks = {}  # (task, model_name) -> Lock; satu load per model pada satu waktu
+
+    def get(self, task, model_name):
+        """
+        Mengembalikan model yang sudah dimuat, memuatnya lebih dulu bila belum resident. Load (unduh bobot,
+        build graph) berjalan di luar lock registry dengan lock per model, sehingga load yang lambat tidak
+        menahan get() untuk model lain yang sudah resident; lock global hanya untuk mencatat dan eviction.
+        """
+        key = (task, model_name)
+        with self._lock:
+            model = self._cached_model(key) if key in self._entries else None
+            if model is not None:
+                return self._touch(key, model)
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            # Thread lain mungkin sudah selesai memuat model ini selama kita menunggu
+            with self._lock:
+                model = self._cached_model(key) if key in self._entries else None
+            if model is None:
+                tic = time.perf_counter()
+                model = DeepFace.build_model(model_name=model_name, task=task)
+                load_s = time.perf_counter() - tic
+                with self._lock:
+                    entry = self._entries.get(key) or {"uses": 0, "total_latency_s": 0.0, "warmup_s": None, "pinned": False, "loads": 0}
+                    entry.update({"load_s": load_s, "bytes": _estimate_model_bytes(model)})
+                    entry["loads"] += 1
+                    self._entries[key] = entry
+        with self._lock:
+            return self._touch(key, model)
+
+    def _touch(self, key, model):
+        """Mencatat pemakaian (dipanggil dengan self._lock dipegang) lalu menegakkan batas LRU."""
+        entry = self._entries[key]
+        entry["uses"] += 1
+        entry["last_used"] = time.time()
+        self._entries.move_to_end(key)
+        self._enforce_budget(keep=key)
+        return model
+
+    @contextmanager
+    def use(self, task, model_name, profiler=None):
+        """
+        Context manager: memastikan model resident lalu mencatat latensi blok inferensi di dalamnya.
+        Bila 'profiler' diisi dan model belum resident, waktu load dicatat sebagai tahap 'model_load:<model>'
+        sehingga tidak tercampur dengan waktu inferensi pemanggil.
+        """
+        with self._lock:
+            resident = self._is_cached((task, model_name))
+        if profiler is not None and not resident:
+            with profiler.stage(f"model_load:{model_name}"):
+                model = self.get(task, model_name)
+        else:
+            model = self.get(task, model_name)
+        tic = time.perf_counter()
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry = self._entries.get((task, model_name))
+                if entry is not None:
+                    entry["total_latency_s"] += time.perf_counter() - tic
+
+    def preload(self, specs, warmup=True, pin=True):
+        """
+        Memuat daftar (task, model_name) sekaligus, misalnya saat startup, dan opsional menjalankan
+        satu inferensi warmup agar graph TensorFlow sudah terbangun sebelum request pertama.
+        Dengan pin=True hanya model dalam 'specs' yang di-pin; pin konfigurasi sebelumnya dilepas.
+        """
+        specs = [tuple(spec) for spec in specs]
+        if pin:
+            with self._lock:
+                for key, entry in self._entries.items():
+                    if key not in specs:
+                        entry["pinned"] = False
+        for task, model_name in specs:
+            if task == TASK_DETECTOR and model_name == "skip":
+                continue
+            model = self.get(task, model_name)
+            with self._lock:
+                self._entries[(task, model_name)]["pinned"] = pin
+            if warmup:
+                self.warmup(task, model_name, model)
+        with self._lock:
+            self._enforce_budget(keep=None)
+
+    def warmup(self, task, model_name, model=None):
+        """Menjalankan satu inferensi pada input kosong dan mencatat durasinya."""
+        model = model or self.get(task, model_name)
+        tic = time.perf_counter()
+        if task == TASK_RECOGNITION:
+            # input_shape DeepFace berupa (lebar, tinggi)
+            width, height = model.input_shape
+            model.forward(np.zeros((1, height, width, 3), dtype=np.float32))
+        elif task == TASK_ATTRIBUTE:
+            model.predict(np.zeros((1, *ATTRIBUTE_INPUT_SIZE, 3), dtype=np.float32))
+        elif task == TASK_DETECTOR:
+            model.detect_faces(np.zeros((*ATTRIBUTE_INPUT_SIZE, 3), dtype=np.uint8))
+        with self._lock:
+            self._entries[(task, model_name)]["warmup_s"] = time.perf_counter() - tic
+
+    def evict(self, task, model_name):
+        """Mengeluarkan model dari cache DeepFace sehingga memorinya bisa dibebaskan; statistiknya tetap disimpan."""
+        with self._lock:
+            cached = getattr(modeling, "cached_models", {}).get(task, {})
+            cached.pop(model_name, None)
+            entry = self._entries.get((task, model_name))
+            if entry is not None:
+                entry["pinned"] = False
+                entry["evictions"] = entry.get("evictions", 0) + 1
+        gc.collect()
+
+    def unpinned_slots(self):
+        """Jumlah model tidak di-pin yang bisa resident bersamaan tanpa saling mengeluarkan; None = tanpa batas jumlah."""
+        if self.max_resident_models is None:
+            return None
+        with self._lock:
+            pinned = sum(1 for key, entry in self._entries.items() if entry["pinned"] and self._is_cached(key))
+        return max(0, self.max_resident_models - pinned)
+
+    def stats(self):
+        """Ringkasan per model: status resident, waktu load/warmup, pemakaian, latensi rata-rata, memori."""
+        with self._lock:
+            result = []
+            for (task, model_name), entry in self._entries.items():
+                uses = entry["uses"]
+                result.append({
+                    "task": task, "model_name": model_name, "resident": self._is_cached((task, model_name)),
+                    "pinned": entry["pinned"], "loads": entry["loads"], "evictions": entry.get("evictions", 0),
+                    "load_s": entry["load_s"],
+                    "warmup_s": entry["warmup_s"], "uses": uses,
+                    "avg_latency_s": entry["total_latency_s"] / uses if uses else None,
+                    "memory_mb": entry["bytes"] / (1024 * 1024),
+                })
+            return result
+
+    def _cached_model(self, key):
+        task, model_name = key
+        return getattr(modeling, "cached_models", {}).get(task, {}).get(model_name)
+
+    def _is_cached(self, key):
+        return self._cached_model(key) is not None
+
+    def _resident_bytes(self):
+        return sum(e["bytes"] for k, e in self._entries.items() if self._is_cached(k))
+
+    def _enforce_budget(self, keep):
+        """Mengeluarkan model LRU yang tidak di-pin sampai jumlah dan memori berada di bawah batas."""
+        budget_bytes = self.memory_budget_mb * 1024 * 1024 if self.memory_budget_mb else None
+        for key in list(self._entries):
+            resident = [k for k in self._entries if self._is_cached(k)]
+            over_count = self.max_resident_models is not None and len(resident) > self.max_resident_models
+            over_memory = budget_bytes is not None and self._resident_bytes() > budget_bytes
+            if not (over_count or over_memory):
+                break
+            if key == keep or self._entries[key]["pinned"] or key not in resident:
+                continue
+            self.evict(*key)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Registry bersama untuk seluruh proses (dibuat saat pertama kali dipanggil)."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
+
+
+def default_preload_specs(model_name, detector_backend, actions=None):
+    """Daftar (task, model_name) untuk satu konfigurasi: model similaritas, detektor, dan model atribut."""
+    actions = actions if actions is not None else list(ACTION_MODEL_NAMES)
+    specs = [(TASK_RECOGNITION, model_name), (TASK_DETECTOR, detector_backend)]
+    specs += [(TASK_ATTRIBUTE, ACTION_MODEL_NAMES[action]) for action in actions]
+    return specs
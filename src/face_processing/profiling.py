@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Batas atas bucket histogram latensi (milidetik), gaya Prometheus
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float("inf"))
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def current_rss_bytes():
+    """Resident set size proses saat ini; None bila tidak bisa dibaca di platform ini."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+class StageMetrics:
+    """Histogram latensi dan akumulasi delta memori per tahap, diagregasi lintas request (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, stage, seconds, rss_delta_bytes=None):
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0,
+                                                    "buckets": [0] * len(LATENCY_BUCKETS_MS), "rss_delta_sum_bytes": 0})
+            entry["count"] += 1
+            entry["sum_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            for i, upper in enumerate(LATENCY_BUCKETS_MS):
+                if ms <= upper:
+                    entry["buckets"][i] += 1
+                    break
+            if rss_delta_bytes is not None:
+                entry["rss_delta_sum_bytes"] += rss_delta_bytes
+
+    def snapshot(self):
+        """Salinan statistik per tahap: count, mean/max ms, perkiraan p50/p99 dari bucket, dan histogram."""
+        with self._lock:
+            stages = {stage: dict(entry, buckets=list(entry["buckets"])) for stage, entry in self._stages.items()}
+        for entry in stages.values():
+            entry["mean_ms"] = entry["sum_ms"] / entry["count"]
+            entry["p50_ms"] = _bucket_quantile(entry["buckets"], 0.50)
+            entry["p99_ms"] = _bucket_quantile(entry["buckets"], 0.99)
+        return stages
+
+    def prometheus_text(self, prefix="fp_ai_stage"):
+        """Ekspor format teks Prometheus (histogram kumulatif per tahap)."""
+        lines = [f"# TYPE {prefix}_latency_ms histogram"]
+        for stage, entry in sorted(self.snapshot().items()):
+            cumulative = 0
+            for upper, count in zip(LATENCY_BUCKETS_MS, entry["buckets"]):
+                cumulative += count
+                le = "+Inf" if upper == float("inf") else f"{upper:g}"
+                lines.append(f'{prefix}_latency_ms_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_latency_ms_sum{{stage="{stage}"}} {entry["sum_ms"]:.3f}')
+            lines.append(f'{prefix}_latency_ms_count{{stage="{stage}"}} {entry["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+def _bucket_quantile(buckets, q):
+    """Batas atas bucket yang memuat kuantil q (perkiraan kasar, seperti histogram_quantile)."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    cumulative = 0
+    for upper, count in zip(LATENCY_BUCKETS_MS, buckets):
+        cumulative += count
+        if cumulative >= q * total:
+            return upper
+    return LATENCY_BUCKETS_MS[-1]
+
+
+STAGE_METRICS = StageMetrics()
+
+
+class StageProfiler:
+    """
+    Pencatat tahap untuk satu request: setiap 'with profiler.stage(nama)' mencatat durasi dan perubahan
+    RSS ke breakdown request ini sekaligus ke histogram global STAGE_METRICS.
+    Profiler yang sama boleh diteruskan ke fungsi bertingkat (mis. verify -> represent_face).
+    """
+
+    def __init__(self, metrics=STAGE_METRICS):
+        self.metrics = metrics
+        self._records = []
+
+    @contextmanager
+    def stage(self, name):
+        rss_before = current_rss_bytes()
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - tic
+            rss_after = current_rss_bytes()
+            rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+            self._records.append({
+                "stage": name, "time_ms": round(seconds * 1000, 3),
+                "rss_delta_mb": round(rss_delta / (1024 * 1024), 3) if rss_delta is not None else None,
+                "rss_mb": round(rss_after / (1024 * 1024), 1) if rss_after is not None else None,
+            })
+            if self.metrics is not None:
+                self.metrics.observe(name, seconds, rss_delta)
+
+    def breakdown(self):
+        return list(self._records)
@@ -0,0 +1,43 @@
+import json
+import os
+import threading
+
+from deepface.modules.verification import find_threshold
+
+# File JSON hasil calibrate_cli.py; bila diisi, threshold terkalibrasi menggantikan threshold bawaan DeepFace
+THRESHOLDS_FILE_ENV = "FP_AI_THRESHOLDS_FILE"
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def load_thresholds(path):
+    """
+    Membaca file threshold terkalibrasi: {"thresholds": {model: {metrik: {"threshold": ...}}}}.
+    Hasil di-cache per (path, mtime) sehingga file yang diperbarui otomatis dibaca ulang.
+    """
+    mtime = os.path.getmtime(path)
+    with _loaded_lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, encoding="utf-8") as f:
+        thresholds = json.load(f).get("thresholds", {})
+    with _loaded_lock:
+        _loaded[path] = (mtime, thresholds)
+    return thresholds
+
+
+def resolve_threshold(model_name, distance_metric, thresholds=None):
+    """
+    Threshold untuk (model, metrik) beserta sumbernya: 'calibrated' dari 'thresholds' (dict hasil
+    load_thresholds atau path file) atau dari file di env FP_AI_THRESHOLDS_FILE, selain itu 'deepface'.
+    """
+    if thresholds is None:
+        thresholds = os.environ.get(THRESHOLDS_FILE_ENV) or None
+    if isinstance(thresholds, str):
+        thresholds = load_thresholds(thresholds)
+    entry = (thresholds or {}).get(model_name, {}).get(distance_metric)
+    if entry is not None and entry.get("threshold") is not None:
+        return float(entry["threshold"]), "calibrated"
+    return find_threshold(model_name, distance_metric), "deepface"
@@ -0,0 +1,53 @@
+import hashlib
+import numpy as np
+
+DISTANCE_METRICS = ["cosine", "euclidean", "euclidean_l2"]
+
+def content_hash(data):
+    """Hash isi gambar (bytes atau array numpy) untuk kunci cache; 32 karakter hex."""
+    if isinstance(data, np.ndarray):
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(str((data.shape, data.dtype.str)).encode())
+        hasher.update(np.ascontiguousarray(data).data)
+        return hasher.hexdigest()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def l2_normalize(x, axis=-1):
+    """Normalisasi L2 per vektor (baris); vektor nol dibiarkan apa adanya."""
+    x = np.asarray(x, dtype=np.float32)
+    norm = np.linalg.norm(x, axis=axis, keepdims=True)
+    return x / np.where(norm == 0, 1, norm)
+
+def find_distance(source, target, distance_metric="cosine"):
+    """
+    Jarak antara embedding 'source' (d,) dan 'target' (d,) atau (n, d), dengan rumus yang sama
+    seperti DeepFace (cosine, euclidean, euclidean_l2). Mengembalikan float atau array (n,).
+    """
+    source = np.asarray(source, dtype=np.float32)
+    target = np.asarray(target, dtype=np.float32)
+    if distance_metric == "cosine":
+        distance = 1 - (target @ source) / (np.linalg.norm(target, axis=-1) * np.linalg.norm(source))
+    elif distance_metric == "euclidean":
+        distance = np.linalg.norm(target - source, axis=-1)
+    elif distance_metric == "euclidean_l2":
+        distance = np.linalg.norm(l2_normalize(target) - l2_normalize(source), axis=-1)
+    else:
+        raise ValueError(f"Metrik jarak tidak dikenal: {distance_metric}")
+    return float(distance) if np.ndim(distance) == 0 else distance
+
+def pairwise_distances(a, b, distance_metric="cosine"):
+    """
+    Matriks jarak (n, m) antara baris 'a' (n, d) dan 'b' (m, d) dalam satu perkalian matriks,
+    dengan rumus yang sama seperti find_distance. Dipakai per blok agar memori tetap terbatas.
+    """
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if distance_metric == "euclidean":
+        squared = (a * a).sum(axis=1)[:, None] + (b * b).sum(axis=1)[None, :] - 2 * (a @ b.T)
+        return np.sqrt(np.maximum(squared, 0))
+    if distance_metric not in ("cosine", "euclidean_l2"):
+        raise ValueError(f"Metrik jarak tidak dikenal: {distance_metric}")
+    cosine_similarity = l2_normalize(a) @ l2_normalize(b).T
+    if distance_metric == "cosine":
+        return 1 - cosine_similarity
+    return np.sqrt(np.maximum(2 - 2 * cosine_similarity, 0))
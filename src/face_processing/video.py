@@ -0,0 +1,240 @@
+# Pipeline video/webcam: deteksi penuh hanya setiap N frame (atau saat tracker kehilangan wajah), di antaranya
+# posisi wajah diikuti tracker OpenCV yang ringan pada salinan frame beresolusi kecil. Embedding dan atribut
+# dihitung sekali per track baru (satu batch untuk semua wajah baru di frame itu); wajah yang sempat hilang
+# lalu muncul lagi dikenali ulang lewat embedding sehingga atributnya tidak dihitung ulang.
+import itertools
+import time
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from src.face_processing.attribute_cache import AttributeCache
+from src.face_processing.core import (
+    extract_face_records, represent_records_batch, analyze_records_batch, make_thumbnail, FaceRecord, ANALYZE_ACTIONS
+)
+from src.face_processing.embedding_cache import EmbeddingCache
+from src.face_processing.profiling import StageProfiler
+from src.face_processing.thresholds import resolve_threshold
+from src.face_processing.utils import find_distance
+
+# Urutan preferensi tracker: KCF/MOSSE (butuh opencv-contrib) jauh lebih cepat; MIL tersedia di opencv-python biasa
+TRACKER_PREFERENCE = ("KCF", "MOSSE", "CSRT", "MIL")
+
+
+def _tracker_factory(name):
+    for module in (cv2, getattr(cv2, "legacy", None)):
+        factory = getattr(module, f"Tracker{name}_create", None) if module is not None else None
+        if factory is not None:
+            return factory
+    return None
+
+
+def create_tracker(name=None):
+    """Tracker OpenCV berdasarkan nama, atau yang tercepat yang tersedia di build OpenCV ini."""
+    for candidate in ([name] if name else TRACKER_PREFERENCE):
+        factory = _tracker_factory(candidate)
+        if factory is not None:
+            return factory()
+    raise RuntimeError(f"Tracker OpenCV {name or TRACKER_PREFERENCE} tidak tersedia (pasang opencv-contrib-python).")
+
+
+def iter_frames(source, realtime=False):
+    """
+    Frame BGR dari file video (path), kamera lokal (indeks int atau string angka), atau iterable frame.
+    Menghasilkan (frame_index, timestamp_s, frame). Dengan 'realtime', frame file yang tertinggal dari jam
+    dinding dilewati (grab tanpa decode) dan buffer kamera dibatasi agar selalu memproses frame terbaru.
+    """
+    if not isinstance(source, (str, int)):
+        tic = time.perf_counter()
+        for frame_index, frame in enumerate(source):
+            yield frame_index, time.perf_counter() - tic, frame
+        return
+    is_device = isinstance(source, int) or source.isdigit()
+    capture = cv2.VideoCapture(int(source) if is_device else source)
+    if not capture.isOpened():
+        raise ValueError(f"Sumber video tidak dapat dibuka: {source}")
+    try:
+        if is_device:
+            capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_index, tic = 0, time.perf_counter()
+        while True:
+            if realtime and not is_device:
+                target_index = int((time.perf_counter() - tic) * fps)
+                while frame_index < target_index and capture.grab():
+                    frame_index += 1
+            ok, frame = capture.read()
+            if not ok:
+                break
+            timestamp = time.perf_counter() - tic if is_device else frame_index / fps
+            yield frame_index, timestamp, frame
+            frame_index += 1
+    finally:
+        capture.release()
+
+
+def box_iou(a, b):
+    """Intersection-over-union dua kotak (x, y, w, h)."""
+    ix = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+@dataclass
+class FaceTrack:
+    """Satu wajah yang diikuti antar frame; 'box' dalam koordinat frame penuh (x, y, w, h)."""
+    track_id: int
+    identity_id: int
+    box: tuple
+    record: FaceRecord = field(repr=False)
+    tracker: object = field(default=None, repr=False)
+    embedding: np.ndarray = field(default=None, repr=False)
+    attributes: dict = None
+    last_seen_frame: int = 0
+
+
+class VideoFacePipeline:
+    """
+    Memproses aliran frame dan mengembalikan hasil per frame (track, region, atribut). Deteksi penuh dijalankan
+    setiap 'detect_every' frame atau segera saat salah satu tracker gagal; di antaranya hanya tracker yang jalan.
+    """
+
+    def __init__(self, detector_backend="opencv", model_name="VGG-Face", actions=ANALYZE_ACTIONS, distance_metric="cosine",
+                 detect_every=10, tracker_name=None, detection_max_side=640, tracking_max_side=480, iou_threshold=0.3,
+                 reid_ttl_frames=150, compute_embeddings=True):
+        self.detector_backend = detector_backend
+        self.model_name = model_name
+        self.actions = list(actions)
+        self.distance_metric = distance_metric
+        self.detect_every = max(1, detect_every)
+        self.tracker_name = tracker_name
+        self.detection_max_side = detection_max_side
+        self.tracking_max_side = tracking_max_side
+        self.iou_threshold = iou_threshold
+        self.reid_ttl_frames = reid_ttl_frames
+        self.compute_embeddings = compute_embeddings
+        self.threshold, _ = resolve_threshold(model_name, distance_metric)
+        self.tracks = []
+        self._lost = []
+        self._track_ids = itertools.count(1)
+        self._identity_ids = itertools.count(1)
+        self._last_detection_frame = None
+        self._frame_counter = itertools.count()
+        # Setiap track dihitung sekali; cache bersama tidak perlu diisi embedding per frame video
+        self._embedding_cache = EmbeddingCache(max_entries=0)
+        self._attribute_cache = AttributeCache(max_entries=0)
+
+    def run(self, source, max_frames=None, realtime=False):
+        """Generator hasil per frame untuk file video, indeks kamera, atau iterable frame."""
+        for frame_index, timestamp, frame in iter_frames(source, realtime=realtime):
+            if max_frames is not None and frame_index >= max_frames:
+                break
+            yield self.process_frame(frame, frame_index, timestamp)
+
+    def process_frame(self, frame, frame_index=None, timestamp=None):
+        tic = time.perf_counter()
+        frame_index = next(self._frame_counter) if frame_index is None else frame_index
+        profiler = StageProfiler()
+        with profiler.stage("video_downscale"):
+            small = make_thumbnail(frame, self.tracking_max_side)
+        scale = frame.shape[1] / small.shape[1]
+        # Tanpa wajah pun deteksi tetap hanya setiap 'detect_every' frame agar adegan kosong tetap murah
+        detect = self._last_detection_frame is None or frame_index - self._last_detection_frame >= self.detect_every
+        if not detect:
+            with profiler.stage("video_track"):
+                detect = not self._update_trackers(small, scale, frame_index)
+        error = None
+        if detect:
+            error = self._detect(frame, small, scale, frame_index, profiler)
+        return {
+            "frame_index": frame_index, "timestamp": timestamp, "detected": detect, "error": error,
+            "faces": [self._face_result(track, frame_index) for track in self.tracks],
+            "timings": profiler.breakdown(), "time": round(time.perf_counter() - tic, 4),
+        }
+
+    def _update_trackers(self, small, scale, frame_index):
+        """Memperbarui semua tracker; False bila ada yang kehilangan target (memicu deteksi di frame ini)."""
+        all_ok = True
+        for track in self.tracks:
+            ok, box = track.tracker.update(small)
+            if ok:
+                track.box = tuple(int(round(v * scale)) for v in box)
+                track.last_seen_frame = frame_index
+            else:
+                all_ok = False
+        return all_ok
+
+    def _init_tracker(self, track, small, scale):
+        track.tracker = create_tracker(self.tracker_name)
+        x, y, w, h = (int(round(v / scale)) for v in track.box)
+        track.tracker.init(small, (x, y, max(1, w), max(1, h)))
+
+    def _detect(self, frame, small, scale, frame_index, profiler):
+        self._last_detection_frame = frame_index
+        # source_hash eksplisit: hash isi setiap frame video terlalu mahal dan tidak berguna untuk cache.
+        # Satu pemanggilan detektor per frame deteksi: region dan crop ter-align diambil dari salinan kecil,
+        # tanpa deteksi ulang per wajah pada frame resolusi penuh
+        extract_res = extract_face_records(frame, self.detector_backend, source_hash=f"frame:{id(self)}:{frame_index}",
+                                           profiler=profiler, max_detection_side=self.detection_max_side,
+                                           align_on_original=False)
+        records = extract_res["records"]
+        with profiler.stage("video_match"):
+            regions = [(r.region['x'], r.region['y'], r.region['w'], r.region['h']) for r in records]
+            pairs = sorted(((box_iou(track.box, region), t, d) for t, track in enumerate(self.tracks)
+                            for d, region in enumerate(regions)), reverse=True)
+            matched_tracks, matched_detections = set(), set()
+            for iou, t, d in pairs:
+                if iou < self.iou_threshold:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                matched_tracks.add(t)
+                matched_detections.add(d)
+                track = self.tracks[t]
+                track.box, track.record, track.last_seen_frame = regions[d], records[d], frame_index
+            self._lost += [track for t, track in enumerate(self.tracks) if t not in matched_tracks]
+            self._lost = [track for track in self._lost if frame_index - track.last_seen_frame <= self.reid_ttl_frames]
+            new_tracks = [FaceTrack(track_id=next(self._track_ids), identity_id=0, box=regions[d], record=records[d],
+                                    last_seen_frame=frame_index)
+                          for d in range(len(records)) if d not in matched_detections]
+            self.tracks = [track for t, track in enumerate(self.tracks) if t in matched_tracks] + new_tracks
+        if new_tracks:
+            self._describe_new_tracks(new_tracks, profiler)
+        with profiler.stage("video_tracker_init"):
+            for track in self.tracks:
+                self._init_tracker(track, small, scale)
+        return extract_res["error"] if not records else None
+
+    def _describe_new_tracks(self, new_tracks, profiler):
+        """Embedding (satu batch) untuk re-identifikasi, lalu atribut (satu batch) hanya untuk identitas baru."""
+        if self.compute_embeddings:
+            embeddings = represent_records_batch([t.record for t in new_tracks], self.model_name,
+                                                 cache=self._embedding_cache, profiler=profiler)
+            for track, embedding in zip(new_tracks, embeddings):
+                track.embedding = embedding
+                candidates = [lost for lost in self._lost if lost.embedding is not None]
+                if candidates:
+                    distances = np.atleast_1d(find_distance(embedding, np.stack([c.embedding for c in candidates]), self.distance_metric))
+                    best = int(np.argmin(distances))
+                    if distances[best] <= self.threshold:
+                        track.identity_id, track.attributes = candidates[best].identity_id, candidates[best].attributes
+                        self._lost.remove(candidates[best])
+        for track in new_tracks:
+            if not track.identity_id:
+                track.identity_id = next(self._identity_ids)
+        pending = [track for track in new_tracks if track.attributes is None]
+        if self.actions and pending:
+            results = analyze_records_batch([t.record for t in pending], self.actions, profiler=profiler, cache=self._attribute_cache)
+            for track, result in zip(pending, results):
+                track.attributes = {k: v for k, v in result.items() if k not in ('region', 'face_confidence')}
+
+    @staticmethod
+    def _face_result(track, frame_index):
+        x, y, w, h = track.box
+        return {"track_id": track.track_id, "identity_id": track.identity_id,
+                "region": {"x": int(x), "y": int(y), "w": int(w), "h": int(h)},
+                "stale": track.last_seen_frame != frame_index,
+                "confidence": float(track.record.confidence or 0.0), "attributes": track.attributes}
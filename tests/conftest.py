@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Test mengimpor modul sebagai src.face_processing.* dari root repositori (sama seperti app.py dan CLI)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
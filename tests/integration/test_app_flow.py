@@ -0,0 +1,110 @@
+import contextlib
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("deepface")
+
+from deepface.models.FacialRecognition import FacialRecognition  # noqa: E402
+
+from src.face_processing import core, embedding_cache  # noqa: E402
+from src.face_processing.core import (  # noqa: E402
+    extract_face_records, represent_records_batch, verify_images, enroll_face, identify_face
+)
+from src.face_processing.gallery import FaceGallery  # noqa: E402
+from src.face_processing.model_registry import TASK_RECOGNITION  # noqa: E402
+
+MODEL = "FakeNet"
+CALIBRATED = {MODEL: {"cosine": {"threshold": 0.01}}}
+
+
+def _face(rgb):
+    return np.ones((16, 16, 3)) * np.array(rgb)
+
+
+# Wajah per "unggahan"; gambar dibedakan dari nilai piksel pertamanya
+FACES = {1: [_face((0.2, 0.4, 0.6))], 2: [_face((0.21, 0.4, 0.6)), _face((0.6, 0.4, 0.2))]}
+
+
+class FakeRecognitionModel(FacialRecognition):
+    """Embedding = rata-rata warna crop; cukup untuk membedakan wajah sintetis tanpa bobot model."""
+
+    def __init__(self):
+        self.model_name = MODEL
+        self.input_shape = (8, 8)
+        self.output_shape = 3
+        self.batch_sizes = []
+
+    def model(self, batch, training=False):
+        self.batch_sizes.append(len(batch))
+        values = np.asarray(batch).mean(axis=(1, 2))
+
+        class _Tensor:
+            def numpy(self):
+                return values
+        return _Tensor()
+
+
+class FakeRegistry:
+    def __init__(self, recognition_model):
+        self.recognition_model = recognition_model
+
+    @contextlib.contextmanager
+    def use(self, task, model_name):
+        yield self.recognition_model if task == TASK_RECOGNITION else None
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    model = FakeRecognitionModel()
+
+    def extract_faces(img_path, detector_backend, enforce_detection, align, **kwargs):
+        faces = FACES[int(img_path[0, 0, 0])]
+        return [{"face": face, "facial_area": {"x": 10 * i, "y": 0, "w": 16, "h": 16}, "confidence": 0.99}
+                for i, face in enumerate(faces)]
+
+    monkeypatch.setattr(core.DeepFace, "extract_faces", extract_faces)
+    monkeypatch.setattr(core, "get_registry", lambda: FakeRegistry(model))
+    monkeypatch.setattr(embedding_cache, "_default_cache", embedding_cache.EmbeddingCache())
+    monkeypatch.delenv("FP_AI_THRESHOLDS_FILE", raising=False)
+    return model
+
+
+def _upload(value):
+    return np.full((60, 80, 3), value, dtype=np.uint8)
+
+
+def test_extract_embed_once_then_verify_from_cache(fake_models):
+    records_a = extract_face_records(_upload(1))["records"]
+    records_b = extract_face_records(_upload(2))["records"]
+    assert len(records_a) == 1 and len(records_b) == 2
+
+    # Semua wajah kedua unggahan dalam satu batch inferensi, seperti tombol analisis di app.py
+    represent_records_batch(records_a + records_b, MODEL)
+    assert fake_models.batch_sizes == [3]
+
+    same = verify_images(records_a[0], records_b[0], MODEL, "opencv", "cosine", thresholds=CALIBRATED)
+    different = verify_images(records_a[0], records_b[1], MODEL, "opencv", "cosine", thresholds=CALIBRATED)
+    assert same.get("error") is None and different.get("error") is None
+    assert same["verified"] and not different["verified"]
+    assert same["threshold"] == 0.01 and same["threshold_source"] == "calibrated"
+    assert same["facial_areas"]["img2"] == records_b[0].region
+    # Ganti wajah/metrik hanya membaca cache embedding
+    assert fake_models.batch_sizes == [3]
+
+
+def test_enroll_then_identify(fake_models, tmp_path):
+    gallery = FaceGallery(str(tmp_path))
+    record_a = extract_face_records(_upload(1))["records"][0]
+    other = extract_face_records(_upload(2))["records"][1]
+    represent_records_batch([record_a, other], MODEL)
+    assert enroll_face(gallery, "alice", record_a, MODEL)["error"] is None
+    assert enroll_face(gallery, "bob", other, MODEL)["error"] is None
+
+    probe = extract_face_records(_upload(2))["records"][0]
+    represent_records_batch([probe], MODEL)
+    result = identify_face(gallery, probe, MODEL, distance_metric="cosine", top_k=2)
+    assert result["error"] is None and result["gallery_size"] == 2
+    assert [m["identity"] for m in result["matches"]] == ["alice", "bob"]
+    assert result["matches"][0]["verified"]
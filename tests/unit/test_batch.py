@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from src.face_processing.batch import ResultWriter, _failed_chunk_rows, _run_batched, chunked, iter_image_paths, iter_pairs
+
+
+def test_done_keys_lists_written_rows_and_skips_truncated_line(tmp_path):
+    output = str(tmp_path / "hasil.jsonl")
+    writer = ResultWriter(output, "path")
+    writer.write([{"path": "a.jpg", "error": None}, {"path": "b.jpg", "error": "Tidak ada wajah"}])
+    writer.close()
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"path": "c.jp')  # baris terpotong saat crash
+    resumed = ResultWriter(output, "path")
+    assert resumed.done_keys() == {"a.jpg", "b.jpg"}
+    resumed.write([{"path": "c.jpg", "error": None}])
+    resumed.close()
+    assert ResultWriter(output, "path").done_keys() == {"a.jpg", "b.jpg", "c.jpg"}
+    with open(output, encoding="utf-8") as f:
+        assert [json.loads(line)["path"] for line in f] == ["a.jpg", "b.jpg", "c.jpg"]
+
+
+def test_partial_first_line_is_dropped(tmp_path):
+    output = tmp_path / "hasil.jsonl"
+    output.write_text('{"path": "a.j', encoding="utf-8")
+    writer = ResultWriter(str(output), "path")
+    writer.write([{"path": "b.jpg"}])
+    writer.close()
+    assert output.read_text(encoding="utf-8") == '{"path": "b.jpg"}\n'
+
+
+def test_resume_skips_items_of_completed_chunks(tmp_path):
+    output = str(tmp_path / "hasil.jsonl")
+    items = [f"img{i}.jpg" for i in range(7)]
+    writer = ResultWriter(output, "path")
+    for chunk in list(chunked(items, 3))[:2]:
+        writer.write([{"path": path, "error": None} for path in chunk])
+    writer.close()
+    done = ResultWriter(output, "path").done_keys()
+    assert [item for item in items if item not in done] == ["img6.jpg"]
+
+
+def test_failed_chunk_rows_mark_chunk_done(tmp_path):
+    output = str(tmp_path / "pasangan.jsonl")
+    writer = ResultWriter(output, "pair")
+    writer.write(_failed_chunk_rows([("a.jpg", "b.jpg"), ("c.jpg", "d.jpg")], "pair", "Chunk gagal"))
+    writer.close()
+    assert ResultWriter(output, "pair").done_keys() == {"a.jpg|b.jpg", "c.jpg|d.jpg"}
+
+
+def test_run_batched_isolates_failing_record():
+    def double(records):
+        if any(r < 0 for r in records):
+            raise ValueError("rusak")
+        return [r * 2 for r in records]
+
+    assert _run_batched(double, [1, 2]) == [(2, None), (4, None)]
+    outcomes = _run_batched(double, [1, -1, 3])
+    assert outcomes[0] == (2, None) and outcomes[2] == (6, None)
+    assert outcomes[1][0] is None and "rusak" in outcomes[1][1]
+
+
+def test_write_serializes_numpy_values(tmp_path):
+    np = pytest.importorskip("numpy")
+    output = str(tmp_path / "hasil.jsonl")
+    writer = ResultWriter(output, "path")
+    writer.write([{"path": "a.jpg", "confidence": np.float32(0.5), "embedding": np.arange(3)}])
+    writer.close()
+    with open(output, encoding="utf-8") as f:
+        assert json.loads(f.readline()) == {"path": "a.jpg", "confidence": 0.5, "embedding": [0, 1, 2]}
+
+
+def test_iter_image_paths_and_pairs(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("b.jpg", "a.PNG", "sub/c.jpeg", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    assert [p[len(str(tmp_path)) + 1:] for p in iter_image_paths(str(tmp_path))] == ["a.PNG", "b.jpg", "sub/c.jpeg"]
+    pairs_file = tmp_path / "pairs.csv"
+    pairs_file.write_text("# komentar\na.PNG,b.jpg\nsub/c.jpeg\tb.jpg\n", encoding="utf-8")
+    assert [tuple(p[len(str(tmp_path)) + 1:] for p in pair) for pair in iter_pairs(str(pairs_file))] == [
+        ("a.PNG", "b.jpg"), ("sub/c.jpeg", "b.jpg")]
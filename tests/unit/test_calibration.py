@@ -0,0 +1,132 @@
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.face_processing.calibration import (
+    evaluate_metric, pair_histograms, roc_from_histograms, dataset_fingerprint, iter_identity_images,
+    save_embeddings, load_embeddings, write_thresholds
+)
+from src.face_processing.utils import pairwise_distances
+
+EDGES = np.linspace(0.0, 1.0, 11)  # 10 bin selebar 0.1
+
+
+def _histograms():
+    # Genuine terkumpul di jarak kecil, impostor di jarak besar, dengan sedikit tumpang tindih di bin 4-5
+    genuine = np.array([0, 10, 40, 30, 15, 5, 0, 0, 0, 0])
+    impostor = np.array([0, 0, 0, 0, 5, 15, 30, 30, 15, 5])
+    return genuine, impostor
+
+
+def test_roc_rates_are_cumulative():
+    roc = roc_from_histograms(*_histograms(), EDGES)
+    np.testing.assert_allclose(roc["threshold"], EDGES[1:])
+    np.testing.assert_allclose(roc["tar"][[0, 3, 5, 9]], [0.0, 0.8, 1.0, 1.0])
+    np.testing.assert_allclose(roc["far"][[3, 4, 5, 9]], [0.0, 0.05, 0.2, 1.0])
+    np.testing.assert_allclose(roc["frr"], 1 - roc["tar"])
+
+
+def test_eer_threshold_and_auc():
+    report = evaluate_metric(*_histograms(), EDGES)
+    assert report["criterion"] == "eer"
+    # Bin 4 (threshold 0.5): FAR 0.05, FRR 0.05
+    assert report["threshold"] == pytest.approx(0.5)
+    assert report["eer"] == pytest.approx(0.05)
+    assert report["far"] == pytest.approx(0.05) and report["frr"] == pytest.approx(0.05)
+    assert 0.95 < report["auc"] <= 1.0
+    assert (report["genuine_pairs"], report["impostor_pairs"]) == (100, 100)
+
+
+def test_target_far_picks_largest_threshold_within_target():
+    report = evaluate_metric(*_histograms(), EDGES, target_far=0.1)
+    assert report["threshold"] == pytest.approx(0.5)
+    assert report["far"] <= 0.1
+
+
+def test_unreachable_target_far_has_no_threshold(tmp_path):
+    genuine, impostor = _histograms()
+    impostor = impostor.copy()
+    impostor[0] = 50  # FAR terendah yang bisa dicapai sudah 1/3
+    report = evaluate_metric(genuine, impostor, EDGES, target_far=0.01)
+    assert report["threshold"] is None and report["far"] is None and report["frr"] is None
+    output = tmp_path / "thresholds.json"
+    write_thresholds(str(output), {"VGG-Face": {"cosine": report, "euclidean": evaluate_metric(*_histograms(), EDGES)}}, {})
+    written = json.loads(output.read_text(encoding="utf-8"))["thresholds"]
+    assert list(written["VGG-Face"]) == ["euclidean"]
+
+
+def test_reference_threshold_rates():
+    report = evaluate_metric(*_histograms(), EDGES, reference_threshold=0.3)
+    assert report["deepface_far"] == pytest.approx(0.0)
+    assert report["deepface_frr"] == pytest.approx(0.5)
+
+
+def test_blockwise_histograms_match_brute_force():
+    rng = np.random.default_rng(0)
+    identities = np.repeat(np.arange(12), 5)
+    embeddings = rng.normal(size=(12, 16))[identities] + 0.5 * rng.normal(size=(60, 16))
+    histograms = pair_histograms(embeddings, [f"p{i}" for i in identities], block_size=7, bins=500)
+    upper = np.triu_indices(60, k=1)
+    same = (identities[:, None] == identities[None, :])[upper]
+    for distance_metric, (genuine, impostor, edges) in histograms.items():
+        distances = pairwise_distances(embeddings, embeddings, distance_metric)[upper]
+        assert genuine.sum() == same.sum() and impostor.sum() == (~same).sum()
+        expected, _ = np.histogram(np.clip(distances[same], 0, edges[-1] - 1e-9), bins=edges)
+        np.testing.assert_array_equal(genuine, expected)
+
+
+def test_embedding_cache_manifest_invalidates_on_change(tmp_path):
+    dataset = tmp_path / "dataset"
+    for identity, names in (("alice", ["1.jpg", "2.jpg"]), ("bob", ["1.jpg"])):
+        (dataset / identity).mkdir(parents=True)
+        for name in names:
+            (dataset / identity / name).write_bytes(b"x")
+    items = list(iter_identity_images(str(dataset)))
+    assert [identity for _, identity in items] == ["alice", "alice", "bob"]
+    manifest = {"dataset": dataset_fingerprint(items), "detector_backend": "opencv"}
+    cache_dir = str(tmp_path / "embeddings")
+    save_embeddings(cache_dir, [p for p, _ in items], [i for _, i in items], {"VGG-Face": np.ones((3, 4), np.float32)}, manifest)
+
+    paths, identities, embeddings = load_embeddings(cache_dir, ["VGG-Face"], manifest)
+    assert identities == ["alice", "alice", "bob"] and embeddings["VGG-Face"].shape == (3, 4)
+    assert load_embeddings(cache_dir, ["ArcFace"], manifest) is None
+    assert load_embeddings(cache_dir, ["VGG-Face"], dict(manifest, detector_backend="mtcnn")) is None
+    (dataset / "bob" / "2.jpg").write_bytes(b"y")
+    changed = {"dataset": dataset_fingerprint(list(iter_identity_images(str(dataset)))), "detector_backend": "opencv"}
+    assert load_embeddings(cache_dir, ["VGG-Face"], changed) is None
+
+
+def test_embed_dataset_skips_records_that_fail_one_model(tmp_path, monkeypatch):
+    pytest.importorskip("cv2")
+    pytest.importorskip("deepface")
+    from src.face_processing import core
+
+    items = []
+    for i, identity in enumerate(["alice", "alice", "bob", "bob"]):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(str(i).encode())
+        items.append((str(path), identity))
+
+    def extract_face_record(img_bytes, detector_backend):
+        if img_bytes == b"3":
+            return {"record": None, "error": "Tidak ada wajah"}
+        return {"record": int(img_bytes), "error": None}
+
+    def represent_records_batch(records, model_name, cache=None):
+        if model_name == "ArcFace" and 1 in records:
+            raise ValueError("crop rusak")
+        return [np.full(2, record, np.float32) for record in records]
+
+    monkeypatch.setattr(core, "extract_face_record", extract_face_record)
+    monkeypatch.setattr(core, "represent_records_batch", represent_records_batch)
+    from src.face_processing.calibration import embed_dataset
+    paths, identities, embeddings, failures = embed_dataset(items, ["VGG-Face", "ArcFace"], chunk_size=4, log=io.StringIO())
+    assert identities == ["alice", "bob"]
+    assert [os.path.basename(p) for p in paths] == ["0.jpg", "2.jpg"]
+    for model_name in ("VGG-Face", "ArcFace"):
+        np.testing.assert_array_equal(embeddings[model_name][:, 0], [0, 2])
+    assert sorted(os.path.basename(f["path"]) for f in failures) == ["1.jpg", "3.jpg"]
+    assert "ArcFace" in next(f["error"] for f in failures if f["path"].endswith("1.jpg"))
@@ -0,0 +1,45 @@
+import numpy as np
+
+from src.face_processing.embedding_cache import EmbeddingCache
+
+
+def _key(name):
+    return EmbeddingCache.make_key(name, "VGG-Face", "opencv", True)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put(_key("a"), [1.0])
+    cache.put(_key("b"), [2.0])
+    assert cache.get(_key("a")) is not None  # 'a' jadi yang terbaru
+    cache.put(_key("c"), [3.0])
+    assert cache.get(_key("b")) is None
+    np.testing.assert_array_equal(cache.get(_key("a")), [1.0])
+    np.testing.assert_array_equal(cache.get(_key("c")), [3.0])
+    assert cache.stats()["entries"] == 2
+
+
+def test_max_entries_zero_disables_memory_cache():
+    cache = EmbeddingCache(max_entries=0)
+    cache.put(_key("a"), [1.0])
+    assert cache.get(_key("a")) is None
+
+
+def test_put_returns_read_only_float32():
+    embedding = EmbeddingCache().put(_key("a"), [1, 2, 3])
+    assert embedding.dtype == np.float32
+    assert not embedding.flags.writeable
+
+
+def test_persisted_embedding_survives_new_instance(tmp_path):
+    EmbeddingCache(persist_dir=str(tmp_path)).put(_key("a"), [0.5, 0.25])
+    restarted = EmbeddingCache(persist_dir=str(tmp_path))
+    np.testing.assert_array_equal(restarted.get(_key("a")), np.array([0.5, 0.25], dtype=np.float32))
+    assert restarted.get(_key("b")) is None
+    assert restarted.stats()["hits"] == 1 and restarted.stats()["misses"] == 1
+
+
+def test_key_distinguishes_model_detector_and_align():
+    keys = {EmbeddingCache.make_key("h", "VGG-Face", "opencv", True), EmbeddingCache.make_key("h", "ArcFace", "opencv", True),
+            EmbeddingCache.make_key("h", "VGG-Face", "mtcnn", True), EmbeddingCache.make_key("h", "VGG-Face", "opencv", False)}
+    assert len(keys) == 4
@@ -0,0 +1,191 @@
+import contextlib
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("deepface")
+
+from src.face_processing import core  # noqa: E402
+from src.face_processing.core import _offset_region, _forward_batch, extract_face_records, decode_image_bytes  # noqa: E402
+
+# Gambar 800x400; dengan max_detection_side=200 salinan deteksinya 200x100 (skala 4)
+FULL_SHAPE, DETECT_SHAPE = (400, 800, 3), (100, 200, 3)
+DETECTED_AREA = {"x": 50, "y": 20, "w": 30, "h": 40, "left_eye": (60, 30), "right_eye": (70, 30)}
+MAPPED_AREA = {"x": 200, "y": 80, "w": 120, "h": 160, "left_eye": (240, 120), "right_eye": (280, 120)}
+NO_EYES = {"left_eye": None, "right_eye": None}
+
+
+class _NoopRegistry:
+    @contextlib.contextmanager
+    def use(self, task, model_name):
+        yield None
+
+
+@pytest.fixture
+def fake_detector(monkeypatch):
+    """DeepFace.extract_faces palsu: satu wajah di salinan deteksi; tempat lain memakai 'crop_faces'."""
+    state = {"calls": [], "crop_faces": None, "detected_area": DETECTED_AREA}
+
+    def extract_faces(img_path, detector_backend, enforce_detection, align, **kwargs):
+        state["calls"].append((img_path.shape, align))
+        if img_path.shape == DETECT_SHAPE:
+            return [{"face": np.zeros((10, 10, 3)), "facial_area": dict(state["detected_area"]), "confidence": 0.9}]
+        if state["crop_faces"] is not None:
+            return state["crop_faces"]
+        raise ValueError("Face could not be detected")
+
+    monkeypatch.setattr(core.DeepFace, "extract_faces", extract_faces)
+    monkeypatch.setattr(core, "get_registry", lambda: _NoopRegistry())
+    return state
+
+
+def test_offset_region_scales_and_shifts_box_and_eyes():
+    region = {"x": 3, "y": 4, "w": 5, "h": 6, "left_eye": (4, 5), "right_eye": None, "extra": "tetap"}
+    mapped = _offset_region(region, scale=2.0, dx=10, dy=5)
+    assert mapped == {"x": 16, "y": 13, "w": 10, "h": 12, "left_eye": (18, 15), "right_eye": None, "extra": "tetap"}
+    assert region["x"] == 3  # input tidak diubah
+
+
+def test_offset_region_identity():
+    assert _offset_region(MAPPED_AREA) == MAPPED_AREA
+
+
+def test_detection_copy_boxes_map_back_to_original(fake_detector):
+    result = extract_face_records(np.zeros(FULL_SHAPE, np.uint8), max_detection_side=200, source_hash="h", align_on_original=False)
+    assert result["error"] is None
+    assert result["records"][0].region == MAPPED_AREA
+    assert result["image_size"] == {"w": 800, "h": 400}
+    # Satu pemanggilan detektor (dengan alignment) pada salinan kecil saja
+    assert fake_detector["calls"] == [(DETECT_SHAPE, True)]
+
+
+def test_large_image_is_aligned_from_eyes_without_redetecting(fake_detector):
+    image = np.random.default_rng(0).integers(0, 255, FULL_SHAPE, dtype=np.uint8)
+    record = extract_face_records(image, max_detection_side=200, source_hash="h")["records"][0]
+    assert record.region == MAPPED_AREA
+    assert record.confidence == 0.9
+    # Mata sejajar horizontal: sudut 0, crop ter-align sama dengan kotak wajah di gambar penuh
+    np.testing.assert_allclose(record.face, image[80:240, 200:320, ::-1] / 255.0)
+    assert fake_detector["calls"] == [(DETECT_SHAPE, False)]
+
+
+def test_tilted_eyes_rotate_full_resolution_crop(fake_detector):
+    fake_detector["detected_area"] = dict(DETECTED_AREA, right_eye=(70, 40))
+    record = extract_face_records(np.full(FULL_SHAPE, 255, np.uint8), max_detection_side=200, source_hash="h")["records"][0]
+    assert record.face.shape[2] == 3 and record.face.size > 0
+    assert fake_detector["calls"] == [(DETECT_SHAPE, False)]
+
+
+def test_missing_eyes_fall_back_to_unaligned_crop(fake_detector):
+    fake_detector["detected_area"] = dict(DETECTED_AREA, **NO_EYES)
+    image = np.random.default_rng(0).integers(0, 255, FULL_SHAPE, dtype=np.uint8)
+    record = extract_face_records(image, max_detection_side=200, source_hash="h")["records"][0]
+    assert record.region == dict(MAPPED_AREA, **NO_EYES)
+    np.testing.assert_allclose(record.face, image[80:240, 200:320, ::-1] / 255.0)
+    assert fake_detector["calls"][0] == (DETECT_SHAPE, False)
+    assert fake_detector["calls"][1][1] is True  # tanpa titik mata: deteksi ulang + align pada crop gambar penuh
+
+
+def test_missing_eyes_offsets_redetected_face(fake_detector):
+    fake_detector["detected_area"] = dict(DETECTED_AREA, **NO_EYES)
+    fake_detector["crop_faces"] = [{"face": np.ones((5, 5, 3)), "facial_area": {"x": 100, "y": 80, "w": 110, "h": 150}, "confidence": 0.8}]
+    record = extract_face_records(np.zeros(FULL_SHAPE, np.uint8), max_detection_side=200, source_hash="h")["records"][0]
+    # Crop dimulai di (200 - 96, 0): margin 0.6 x sisi terpanjang kotak (160)
+    assert (record.region["x"], record.region["y"], record.region["w"], record.region["h"]) == (204, 80, 110, 150)
+    assert record.confidence == 0.8
+
+
+def test_small_image_is_detected_and_aligned_in_one_call(fake_detector):
+    result = extract_face_records(np.zeros(DETECT_SHAPE, np.uint8), source_hash="h")
+    assert result["records"][0].region == DETECTED_AREA
+    assert fake_detector["calls"] == [(DETECT_SHAPE, True)]
+
+
+def test_detection_image_is_reused_for_bytes(fake_detector, monkeypatch):
+    ok, encoded = cv2.imencode(".jpg", np.zeros(FULL_SHAPE, np.uint8))
+    img_bytes = encoded.tobytes()
+    detection_image = decode_image_bytes(img_bytes, max_side=200)
+    assert detection_image.shape == DETECT_SHAPE
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("bytes tidak boleh di-decode ulang")
+
+    monkeypatch.setattr(core, "decode_image_bytes", no_decode)
+    result = extract_face_records(img_bytes, max_detection_side=200, detection_image=detection_image, align_on_original=False)
+    assert result["records"][0].region == MAPPED_AREA
+
+
+class _Tensor:
+    def __init__(self, values):
+        self._values = values
+
+    def numpy(self):
+        return self._values
+
+
+class _CustomForwardModel:
+    """Model dengan forward sendiri; 'model' Keras palsu mencatat ukuran batch yang diterima."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.batch_sizes = []
+
+    def model(self, batch, training=False):
+        self.batch_sizes.append(len(batch))
+        return _Tensor(batch.reshape(len(batch), -1) * 3.0)
+
+    def forward(self, img):
+        return self.model(img).numpy()[0].tolist()
+
+
+def test_forward_batch_runs_vgg_face_once_and_normalizes_rows():
+    model = _CustomForwardModel("VGG-Face")
+    embeddings = _forward_batch(model, np.array([[[3.0, 4.0]], [[0.0, 2.0]]]))
+    assert model.batch_sizes == [2]
+    np.testing.assert_allclose(embeddings, [[0.6, 0.8], [0.0, 1.0]], atol=1e-6)
+
+
+def test_forward_batch_keeps_per_item_path_for_custom_models():
+    model = _CustomForwardModel("SFace")
+    embeddings = _forward_batch(model, np.ones((3, 1, 2)))
+    assert model.batch_sizes == [1, 1, 1]
+    assert len(embeddings) == 3
+
+
+class _RecordingRegistry:
+    """Registry palsu: mencatat setiap use() dan mengembalikan model atribut dengan jumlah kelas yang benar."""
+
+    CLASSES = {"Age": 101, "Emotion": 7, "Gender": 2, "Race": 6}
+
+    def __init__(self):
+        self.used = []
+
+    @contextlib.contextmanager
+    def use(self, task, model_name, profiler=None):
+        self.used.append(model_name)
+        classes = self.CLASSES[model_name]
+        model = type("FakeAttributeModel", (), {})()
+        model.model = lambda batch, training=False: _Tensor(np.full((len(batch), classes), 1.0 / classes))
+        yield model
+
+
+def test_adding_an_action_runs_only_the_missing_model(monkeypatch):
+    from src.face_processing.attribute_cache import AttributeCache
+
+    registry = _RecordingRegistry()
+    monkeypatch.setattr(core, "get_registry", lambda: registry)
+    cache = AttributeCache()
+    records = [core.FaceRecord(face=np.full((32, 32, 3), 0.5), region={"x": i, "y": 0, "w": 32, "h": 32},
+                               detector_backend="opencv", source_hash="h") for i in range(2)]
+
+    first = core.analyze_records_batch(records, ["emotion"], cache=cache)
+    assert registry.used == ["Emotion"]
+    assert all("dominant_emotion" in result and "age" not in result for result in first)
+
+    registry.used.clear()
+    second = core.analyze_records_batch(records, ["emotion", "age"], cache=cache)
+    assert registry.used == ["Age"]
+    assert [r["emotion"] for r in second] == [r["emotion"] for r in first]
+    expected_age = int(np.sum(np.full(101, 1.0 / 101) * np.arange(0, 101)))
+    assert all(result["age"] == expected_age for result in second)
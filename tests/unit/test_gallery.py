@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from src.face_processing import gallery
+from src.face_processing.gallery import EmbeddingStore, FaceGallery
+from src.face_processing.utils import find_distance
+
+
+@pytest.fixture
+def small_capacity(monkeypatch):
+    monkeypatch.setattr(gallery, "INITIAL_CAPACITY", 4)
+
+
+def _embeddings(n, dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("distance_metric", ["cosine", "euclidean", "euclidean_l2"])
+def test_search_returns_top_k_in_ascending_distance(tmp_path, distance_metric):
+    embeddings = _embeddings(20)
+    store = EmbeddingStore(str(tmp_path))
+    store.add([f"id{i}" for i in range(20)], embeddings)
+    query = embeddings[3] + 0.01
+    matches = store.search(query, distance_metric, top_k=5)
+    expected = np.argsort(find_distance(query, embeddings, distance_metric))[:5]
+    assert [m["index"] for m in matches] == expected.tolist()
+    assert matches[0]["identity"] == "id3"
+    distances = [m["distance"] for m in matches]
+    assert distances == sorted(distances)
+
+
+def test_search_top_k_larger_than_gallery(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.add(["a", "b"], _embeddings(2))
+    assert len(store.search(_embeddings(1)[0], top_k=10)) == 2
+    assert EmbeddingStore(str(tmp_path / "empty")).search(_embeddings(1)[0]) == []
+
+
+def test_growth_across_capacity_doubling_keeps_rows(tmp_path, small_capacity):
+    embeddings = _embeddings(11)
+    store = EmbeddingStore(str(tmp_path))
+    for i, embedding in enumerate(embeddings):
+        assert store.add([f"id{i}"], [embedding]) == [i]
+    assert store.capacity == 16
+    np.testing.assert_array_equal(store.matrix, embeddings)
+    assert store.search(embeddings[9], top_k=1)[0]["identity"] == "id9"
+
+    reopened = EmbeddingStore(str(tmp_path))
+    assert (reopened.count, reopened.capacity) == (11, 16)
+    np.testing.assert_array_equal(reopened.matrix, embeddings)
+    assert reopened.search(embeddings[10], top_k=1)[0]["identity"] == "id10"
+
+
+def test_add_rejects_dimension_mismatch(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.add(["a"], _embeddings(1, dim=8))
+    with pytest.raises(ValueError):
+        store.add(["b"], _embeddings(1, dim=4))
+
+
+def test_face_gallery_keeps_one_store_per_model(tmp_path):
+    face_gallery = FaceGallery(str(tmp_path))
+    face_gallery.enroll("alice", _embeddings(1, dim=8)[0], "VGG-Face")
+    face_gallery.enroll("bob", _embeddings(1, dim=4)[0], "Some/Model")
+    assert face_gallery.size("VGG-Face") == 1 and face_gallery.size("Some/Model") == 1
+    assert face_gallery.store("VGG-Face").identities() == ["alice"]
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+from src.face_processing.micro_batch import MicroBatcher, QueueFullError
+
+
+class RecordingProcessor:
+    """process_fn yang mencatat setiap pemanggilan; payload negatif dianggap input rusak."""
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, key, payloads):
+        with self._lock:
+            self.calls.append((key, list(payloads)))
+        if any(p < 0 for p in payloads):
+            raise ValueError(f"payload rusak: {payloads}")
+        return [f"{key}:{p * 10}" for p in payloads]
+
+
+def test_groups_payloads_by_key_within_one_window():
+    processor = RecordingProcessor()
+    batcher = MicroBatcher(processor, max_batch_size=16, max_wait_ms=200, num_workers=1)
+    futures = [(key, p, batcher.submit(key, p)) for key, p in [("a", 1), ("b", 2), ("a", 3), ("b", 4), ("a", 5)]]
+    for key, p, future in futures:
+        assert future.result(timeout=5) == f"{key}:{p * 10}"
+    assert sorted(processor.calls) == [("a", [1, 3, 5]), ("b", [2, 4])]
+    stats = batcher.stats()
+    assert stats["batches"] == 2 and stats["items"] == 5
+
+
+def test_failing_batch_only_fails_offending_item():
+    processor = RecordingProcessor()
+    batcher = MicroBatcher(processor, max_batch_size=16, max_wait_ms=200, num_workers=1)
+    good, bad, other = batcher.submit("a", 1), batcher.submit("a", -1), batcher.submit("a", 2)
+    assert good.result(timeout=5) == "a:10"
+    assert other.result(timeout=5) == "a:20"
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+    assert batcher.stats()["batch_retries"] == 1
+
+
+def test_error_propagates_to_every_caller_when_all_items_fail():
+    def always_fail(key, payloads):
+        raise RuntimeError("model tidak tersedia")
+
+    batcher = MicroBatcher(always_fail, max_wait_ms=50, num_workers=1)
+    futures = [batcher.submit("a", i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="model tidak tersedia"):
+            future.result(timeout=5)
+
+
+def test_full_queue_is_rejected():
+    release = threading.Event()
+
+    def blocking(key, payloads):
+        release.wait(5)
+        return payloads
+
+    batcher = MicroBatcher(blocking, max_batch_size=1, max_wait_ms=0, max_queue=1, num_workers=1)
+    try:
+        first = batcher.submit("a", 1)
+        # Worker memegang item pertama; antrian berkapasitas 1 terisi oleh item berikutnya
+        while batcher.stats()["queue_depth"] > 0:
+            pass
+        batcher.submit("a", 2)
+        with pytest.raises(QueueFullError):
+            batcher.submit("a", 3)
+        assert batcher.stats()["rejected"] == 1
+    finally:
+        release.set()
+    assert first.result(timeout=5) == 1
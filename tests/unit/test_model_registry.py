@@ -0,0 +1,86 @@
+import pytest
+
+pytest.importorskip("deepface")
+
+from src.face_processing import model_registry  # noqa: E402
+from src.face_processing.model_registry import ModelRegistry, TASK_RECOGNITION  # noqa: E402
+
+
+class _FakeKerasModel:
+    def __init__(self, params):
+        self._params = params
+
+    def count_params(self):
+        return self._params
+
+
+class _FakeModel:
+    def __init__(self, name, params):
+        self.name = name
+        self.model = _FakeKerasModel(params)
+
+
+@pytest.fixture
+def deepface_cache(monkeypatch):
+    """modeling.cached_models kosong dan DeepFace.build_model palsu yang mengisinya seperti aslinya."""
+    cached_models = {}
+    built = []
+
+    def build_model(model_name, task=TASK_RECOGNITION):
+        built.append(model_name)
+        return cached_models.setdefault(task, {}).setdefault(model_name, _FakeModel(model_name, 100_000))
+
+    monkeypatch.setattr(model_registry.modeling, "cached_models", cached_models, raising=False)
+    monkeypatch.setattr(model_registry.DeepFace, "build_model", build_model)
+    return {"cached": cached_models, "built": built}
+
+
+def _resident(deepface_cache):
+    return sorted(deepface_cache["cached"].get(TASK_RECOGNITION, {}))
+
+
+def test_get_loads_once_and_reuses_resident_model(deepface_cache):
+    registry = ModelRegistry()
+    assert registry.get(TASK_RECOGNITION, "A") is registry.get(TASK_RECOGNITION, "A")
+    assert deepface_cache["built"] == ["A"]
+    stats = registry.stats()[0]
+    assert (stats["loads"], stats["uses"], stats["resident"]) == (1, 2, True)
+
+
+def test_least_recently_used_unpinned_model_is_evicted_over_count(deepface_cache):
+    registry = ModelRegistry(max_resident_models=2)
+    registry.get(TASK_RECOGNITION, "A")
+    registry.get(TASK_RECOGNITION, "B")
+    registry.get(TASK_RECOGNITION, "A")  # B sekarang yang paling lama tidak dipakai
+    registry.get(TASK_RECOGNITION, "C")
+    assert _resident(deepface_cache) == ["A", "C"]
+    registry.get(TASK_RECOGNITION, "B")
+    assert deepface_cache["built"] == ["A", "B", "C", "B"]
+
+
+def test_pinned_models_survive_eviction(deepface_cache):
+    registry = ModelRegistry(max_resident_models=2)
+    registry.preload([(TASK_RECOGNITION, "A")], warmup=False)
+    for name in ("B", "C", "D"):
+        registry.get(TASK_RECOGNITION, name)
+    assert _resident(deepface_cache) == ["A", "D"]
+
+
+def test_memory_budget_evicts_least_recently_used(deepface_cache):
+    # Tiap model palsu ~400 KB (100k parameter float32); batas 1 MB muat dua model
+    registry = ModelRegistry(max_resident_models=None, memory_budget_mb=1)
+    for name in ("A", "B", "C"):
+        registry.get(TASK_RECOGNITION, name)
+    assert _resident(deepface_cache) == ["B", "C"]
+
+
+def test_preloading_another_configuration_releases_old_pins(deepface_cache):
+    registry = ModelRegistry(max_resident_models=2)
+    registry.preload([(TASK_RECOGNITION, "A"), (TASK_RECOGNITION, "B")], warmup=False)
+    registry.preload([(TASK_RECOGNITION, "C")], warmup=False)
+    pinned = {s["model_name"]: s["pinned"] for s in registry.stats()}
+    assert pinned == {"A": False, "B": False, "C": True}
+    # Pin lama sudah lepas: konfigurasi baru tetap di bawah batas dengan mengeluarkan model LRU
+    assert _resident(deepface_cache) == ["B", "C"]
+    registry.get(TASK_RECOGNITION, "D")
+    assert _resident(deepface_cache) == ["C", "D"]
@@ -0,0 +1,69 @@
+import pytest
+
+from src.face_processing.profiling import LATENCY_BUCKETS_MS, StageMetrics, StageProfiler, _bucket_quantile
+
+
+def _bucket_index(upper):
+    return LATENCY_BUCKETS_MS.index(upper)
+
+
+def test_observe_places_latency_in_first_bucket_at_or_above_it():
+    metrics = StageMetrics()
+    for seconds in (0.0005, 0.001, 0.0011, 0.25, 60.0):
+        metrics.observe("detect", seconds)
+    entry = metrics.snapshot()["detect"]
+    expected = [0] * len(LATENCY_BUCKETS_MS)
+    for upper in (1, 1, 2, 500, float("inf")):
+        expected[_bucket_index(upper)] += 1
+    assert entry["buckets"] == expected
+    assert entry["count"] == 5
+    assert entry["max_ms"] == pytest.approx(60000.0)
+    assert entry["sum_ms"] == pytest.approx(0.5 + 1 + 1.1 + 250 + 60000)
+
+
+def test_bucket_quantile_estimates():
+    buckets = [0] * len(LATENCY_BUCKETS_MS)
+    buckets[_bucket_index(10)] = 98
+    buckets[_bucket_index(1000)] = 2
+    assert _bucket_quantile(buckets, 0.50) == 10
+    assert _bucket_quantile(buckets, 0.98) == 10
+    assert _bucket_quantile(buckets, 0.99) == 1000
+    assert _bucket_quantile([0] * len(LATENCY_BUCKETS_MS), 0.5) == 0.0
+
+
+def test_snapshot_reports_p50_p99_and_rss_delta():
+    metrics = StageMetrics()
+    for _ in range(99):
+        metrics.observe("embedding", 0.015, rss_delta_bytes=1024)
+    metrics.observe("embedding", 3.0)
+    entry = metrics.snapshot()["embedding"]
+    assert (entry["p50_ms"], entry["p99_ms"]) == (20, 20)
+    assert entry["rss_delta_sum_bytes"] == 99 * 1024
+    assert entry["mean_ms"] == pytest.approx((99 * 15 + 3000) / 100)
+
+
+def test_prometheus_text_has_cumulative_le_buckets():
+    metrics = StageMetrics()
+    for seconds in (0.003, 0.004, 0.15, 20.0):
+        metrics.observe("decode", seconds)
+    lines = metrics.prometheus_text().splitlines()
+    assert lines[0] == "# TYPE fp_ai_stage_latency_ms histogram"
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.rsplit(" ", 1)[1]) for line in lines if "_bucket{" in line}
+    assert list(buckets) == [f"{upper:g}" for upper in LATENCY_BUCKETS_MS[:-1]] + ["+Inf"]
+    assert (buckets["2"], buckets["5"], buckets["100"], buckets["200"], buckets["10000"], buckets["+Inf"]) == (0, 2, 2, 3, 3, 4)
+    counts = list(buckets.values())
+    assert counts == sorted(counts)
+    assert 'fp_ai_stage_latency_ms_count{stage="decode"} 4' in lines
+    assert 'fp_ai_stage_latency_ms_sum{stage="decode"} 20157.000' in lines
+
+
+def test_profiler_records_breakdown_and_feeds_metrics():
+    metrics = StageMetrics()
+    profiler = StageProfiler(metrics=metrics)
+    with profiler.stage("hash"):
+        pass
+    with pytest.raises(ValueError):
+        with profiler.stage("decode"):
+            raise ValueError("rusak")
+    assert [record["stage"] for record in profiler.breakdown()] == ["hash", "decode"]
+    assert set(metrics.snapshot()) == {"hash", "decode"}
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from src.face_processing.utils import find_distance, pairwise_distances, l2_normalize, DISTANCE_METRICS
+
+
+@pytest.mark.parametrize("distance_metric", DISTANCE_METRICS)
+def test_pairwise_distances_matches_find_distance(distance_metric):
+    rng = np.random.default_rng(0)
+    a, b = rng.normal(size=(7, 32)), rng.normal(size=(5, 32))
+    matrix = pairwise_distances(a, b, distance_metric)
+    assert matrix.shape == (7, 5)
+    for i in range(len(a)):
+        np.testing.assert_allclose(matrix[i], find_distance(a[i], b, distance_metric), atol=1e-5)
+
+
+def test_pairwise_distances_rejects_unknown_metric():
+    with pytest.raises(ValueError):
+        pairwise_distances(np.ones((1, 3)), np.ones((1, 3)), "manhattan")
+
+
+def test_l2_normalize_keeps_zero_rows():
+    rows = l2_normalize(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    np.testing.assert_allclose(rows, [[0.6, 0.8], [0.0, 0.0]])
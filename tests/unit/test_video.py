@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("deepface")
+
+from src.face_processing import video  # noqa: E402
+from src.face_processing.core import FaceRecord  # noqa: E402
+from src.face_processing.video import VideoFacePipeline, box_iou  # noqa: E402
+
+ALICE, BOB, BOB_MOVED = (100, 100, 50, 50), (300, 100, 50, 50), (300, 200, 50, 50)
+# Wajah yang terlihat per frame: Bob hilang di frame 4-6 lalu muncul lagi di posisi lain
+SCENE = {i: {"alice": ALICE, "bob": BOB} for i in range(4)}
+SCENE.update({i: {"alice": ALICE} for i in range(4, 7)})
+SCENE.update({i: {"alice": ALICE, "bob": BOB_MOVED} for i in range(7, 10)})
+EMBEDDINGS = {"alice": np.array([1.0, 0.0, 0.0]), "bob": np.array([0.0, 1.0, 0.0])}
+
+
+def _frame(index):
+    frame = np.zeros((480, 640, 3), np.uint8)
+    frame[0, 0, 0] = index  # tracker palsu membaca nomor frame dari piksel pertama
+    return frame
+
+
+class _SceneTracker:
+    """Tracker palsu: mengikuti wajah yang kotaknya cocok saat init, gagal bila wajah itu tidak ada di frame."""
+
+    def init(self, small, box):
+        self.name = next(name for name, face_box in SCENE[int(small[0, 0, 0])].items() if face_box == tuple(box))
+
+    def update(self, small):
+        box = SCENE[int(small[0, 0, 0])].get(self.name)
+        return box is not None, box
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    calls = {"detect": [], "represent": [], "analyze": []}
+
+    def extract_face_records(frame, detector_backend, source_hash=None, **kwargs):
+        frame_index = int(source_hash.rsplit(":", 1)[1])
+        calls["detect"].append(frame_index)
+        records = [FaceRecord(face=np.zeros((8, 8, 3)), region={"x": x, "y": y, "w": w, "h": h}, detector_backend=detector_backend,
+                              confidence=0.9, source_hash=name) for name, (x, y, w, h) in SCENE[frame_index].items()]
+        return {"records": records, "error": None if records else "Tidak ada wajah"}
+
+    def represent_records_batch(records, model_name, cache=None, profiler=None):
+        calls["represent"].append([r.source_hash for r in records])
+        return [EMBEDDINGS[r.source_hash] for r in records]
+
+    def analyze_records_batch(records, actions, profiler=None, cache=None):
+        calls["analyze"].append([r.source_hash for r in records])
+        return [{"region": r.region, "face_confidence": r.confidence, "dominant_emotion": f"{r.source_hash}-senang"} for r in records]
+
+    monkeypatch.setattr(video, "extract_face_records", extract_face_records)
+    monkeypatch.setattr(video, "represent_records_batch", represent_records_batch)
+    monkeypatch.setattr(video, "analyze_records_batch", analyze_records_batch)
+    monkeypatch.setattr(video, "create_tracker", lambda name=None: _SceneTracker())
+    return calls
+
+
+def _faces_by_name(result):
+    return {next(name for name, box in SCENE[result["frame_index"]].items()
+                 if (face["region"]["x"], face["region"]["y"]) == box[:2]): face for face in result["faces"]}
+
+
+def test_box_iou():
+    assert box_iou(ALICE, ALICE) == pytest.approx(1.0)
+    assert box_iou(ALICE, BOB) == 0.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 10, 10)) == pytest.approx(50 / 150)
+
+
+def test_tracks_between_detections_and_reidentifies_returning_face(stubbed):
+    pipeline = VideoFacePipeline(detect_every=3, tracking_max_side=640, distance_metric="cosine", reid_ttl_frames=10)
+    results = list(pipeline.run([_frame(i) for i in range(10)]))
+
+    # Deteksi: frame pertama, tiap 3 frame, dan frame 4 saat tracker Bob kehilangan target
+    assert stubbed["detect"] == [0, 3, 4, 7]
+    assert [r["frame_index"] for r in results if r["detected"]] == [0, 3, 4, 7]
+
+    frames = [_faces_by_name(r) for r in results]
+    assert {f["alice"]["track_id"] for f in frames} == {frames[0]["alice"]["track_id"]}
+    assert {f["alice"]["identity_id"] for f in frames} == {frames[0]["alice"]["identity_id"]}
+    assert all("bob" not in f for f in frames[4:7])
+    bob_before, bob_after = frames[0]["bob"], frames[7]["bob"]
+    # Bob mendapat track baru tetapi dikenali ulang lewat embedding sebagai identitas yang sama
+    assert bob_after["track_id"] != bob_before["track_id"]
+    assert bob_after["identity_id"] == bob_before["identity_id"] != frames[0]["alice"]["identity_id"]
+    assert {f["bob"]["track_id"] for f in frames[7:]} == {bob_after["track_id"]}
+
+    # Embedding hanya untuk track baru; atribut sekali per identitas baru, dipakai ulang saat Bob kembali
+    assert stubbed["represent"] == [["alice", "bob"], ["bob"]]
+    assert stubbed["analyze"] == [["alice", "bob"]]
+    assert frames[9]["bob"]["attributes"] == {"dominant_emotion": "bob-senang"}
+
+
+def test_lost_track_past_ttl_gets_new_identity(stubbed):
+    pipeline = VideoFacePipeline(detect_every=3, tracking_max_side=640, distance_metric="cosine", reid_ttl_frames=2)
+    results = list(pipeline.run([_frame(i) for i in range(8)]))
+    bob_before, bob_after = _faces_by_name(results[0])["bob"], _faces_by_name(results[7])["bob"]
+    assert bob_after["identity_id"] != bob_before["identity_id"]
+    assert stubbed["analyze"] == [["alice", "bob"], ["bob"]]
@@ -0,0 +1,71 @@
+import argparse
+import json
+import sys
+
+# Sama dengan core.ANALYZE_ACTIONS; tidak diimpor dari core agar --help tidak memuat TensorFlow
+ANALYZE_ACTIONS = ['age', 'emotion', 'gender', 'race']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Analisis wajah pada file video atau kamera dengan tracking antar deteksi.")
+    parser.add_argument("--source", required=True, help="Path file video, atau indeks kamera lokal (mis. 0).")
+    parser.add_argument("--output", default=None, help="File .jsonl hasil per frame (default: stdout).")
+    parser.add_argument("--model", default="VGG-Face", help="Model embedding untuk re-identifikasi wajah.")
+    parser.add_argument("--detector", default="opencv", help="Detektor wajah.")
+    parser.add_argument("--actions", default=",".join(ANALYZE_ACTIONS), help="Aksi atribut per identitas, dipisah koma (kosong = tanpa atribut).")
+    parser.add_argument("--detect-every", type=int, default=10, help="Deteksi penuh setiap N frame; di antaranya memakai tracker.")
+    parser.add_argument("--tracker", default=None, help="Nama tracker OpenCV (KCF, MOSSE, CSRT, MIL); default yang tercepat tersedia.")
+    parser.add_argument("--max-frames", type=int, default=None, help="Berhenti setelah N frame.")
+    parser.add_argument("--realtime", action="store_true", help="Lewati frame file video yang tertinggal agar mengikuti waktu nyata.")
+    parser.add_argument("--show", action="store_true", help="Tampilkan jendela pratinjau dengan kotak wajah (tekan q untuk berhenti).")
+    return parser.parse_args(argv)
+
+
+def draw_preview(frame, result):
+    import cv2
+    for face in result["faces"]:
+        r = face["region"]
+        color = (106, 187, 102) if not face["stale"] else (38, 167, 255)
+        cv2.rectangle(frame, (r["x"], r["y"]), (r["x"] + r["w"], r["y"] + r["h"]), color, 2)
+        attributes = face["attributes"] or {}
+        label = " ".join(str(attributes[k]) for k in ("age", "dominant_gender", "dominant_emotion") if k in attributes)
+        cv2.putText(frame, f"#{face['identity_id']} {label}", (r["x"], max(0, r["y"] - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    cv2.imshow("face_processing", frame)
+    return cv2.waitKey(1) & 0xFF != ord("q")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    actions = [a.strip() for a in args.actions.split(",") if a.strip()]
+    unknown = [a for a in actions if a not in ANALYZE_ACTIONS]
+    if unknown:
+        print(f"Aksi atribut tidak dikenal: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    from src.face_processing.model_registry import get_registry, default_preload_specs
+    from src.face_processing.video import VideoFacePipeline, iter_frames
+    get_registry().preload(default_preload_specs(args.model, args.detector, actions), warmup=True)
+    pipeline = VideoFacePipeline(args.detector, args.model, actions, detect_every=args.detect_every, tracker_name=args.tracker)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    processed, total_s = 0, 0.0
+    try:
+        for frame_index, timestamp, frame in iter_frames(args.source, realtime=args.realtime):
+            if args.max_frames is not None and processed >= args.max_frames:
+                break
+            result = pipeline.process_frame(frame, frame_index, timestamp)
+            out.write(json.dumps(result) + "\n")
+            processed += 1
+            total_s += result["time"]
+            if args.show and not draw_preview(frame, result):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if processed and total_s > 0:
+        print(f"[video] {processed} frame, {processed / total_s:.1f} frame/s (rata-rata pemrosesan)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())